@@ -1,15 +1,21 @@
 from django.contrib import admin
+from django.db.models import Q
 from django.shortcuts import reverse, redirect
 from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from phonenumber_field.phonenumber import to_python
+
+from .models import Banner
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
 from .models import Order
 from .models import OrderItem
+from .paginators import EstimatedCountPaginator
+from .services import update_menu_availability
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -20,6 +26,53 @@ class RestaurantMenuItemInline(admin.TabularInline):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'product':
+            # Every row renders the same product select, load it once
+            if not hasattr(request, '_product_choices'):
+                request._product_choices = list(formfield.choices)
+            formfield.choices = request._product_choices
+        return formfield
+
+
+@admin.register(RestaurantMenuItem)
+class RestaurantMenuItemAdmin(admin.ModelAdmin):
+    list_display = [
+        'restaurant',
+        'product',
+        'availability',
+    ]
+    list_filter = [
+        'availability',
+        'restaurant',
+    ]
+    search_fields = [
+        'product__name',
+        'restaurant__name',
+    ]
+    list_select_related = [
+        'restaurant',
+        'product',
+    ]
+    actions = [
+        'make_available',
+        'make_unavailable',
+    ]
+
+    def make_available(self, request, queryset):
+        updated = update_menu_availability(queryset, True)
+        self.message_user(request, f'В продаже позиций: {updated}')
+    make_available.short_description = 'Вернуть в продажу'
+
+    def make_unavailable(self, request, queryset):
+        updated = update_menu_availability(queryset, False)
+        self.message_user(request, f'Снято с продажи позиций: {updated}')
+    make_unavailable.short_description = 'Снять с продажи'
+
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
@@ -119,6 +172,20 @@ class ProductAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'title',
+        'text',
+        'position',
+        'is_active',
+    ]
+    list_editable = [
+        'position',
+        'is_active',
+    ]
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     def get_restaurants(self):
@@ -131,10 +198,59 @@ class OrderAdmin(admin.ModelAdmin):
         'lastname',
         'address',
         'phonenumber',
+        'chosen_restaurant',
+        'registered_at',
+    ]
+    list_select_related = [
+        'chosen_restaurant',
+    ]
+    list_filter = [
+        'status',
+        'payment_type',
+        'registered_at',
+    ]
+    search_fields = [
+        'phonenumber',
+        'firstname',
+        'lastname',
+        'address',
     ]
+    ordering = ['-registered_at', '-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     inlines = [OrderItemInline]
 
+    readonly_fields = [
+        'total_price',
+    ]
+
+    def get_search_results(self, request, queryset, search_term):
+        """Find orders by exact phone number or id, which are indexed.
+
+        Other terms match the beginning of the name or the address
+        instead of the default icontains. On PostgreSQL each prefix is
+        served by an UPPER() text_pattern_ops index from migration 0012,
+        so the OR of the three becomes a bitmap index scan.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit() and len(search_term) < 10:
+            return queryset.filter(id=int(search_term)), False
+        phonenumber = to_python(search_term, region='RU')
+        if phonenumber and phonenumber.is_valid():
+            return queryset.filter(phonenumber=phonenumber), False
+        return queryset.filter(
+            Q(firstname__istartswith=search_term)
+            | Q(lastname__istartswith=search_term)
+            | Q(address__istartswith=search_term)
+        ), False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_total_price()
+
     def response_change(self, request, obj):
         response = super().response_change(request, obj)
         if 'next' in request.GET\
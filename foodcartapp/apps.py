@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class FoodcartappConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'foodcartapp'
+
+    def ready(self):
+        from .checks import check_shared_cache
+        from .signals import connect_signals
+
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
+        connect_signals()
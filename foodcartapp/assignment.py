@@ -0,0 +1,123 @@
+import logging
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Order
+from .order_distances import get_order_distances
+
+
+logger = logging.getLogger(__name__)
+
+
+def plan_assignments(distances, loads, cap):
+    """Greedily match orders (rows) to restaurants (columns), nearest first.
+
+    Pairs are taken in order of increasing distance; a pair is accepted
+    while its order is unassigned and its restaurant has fewer than cap
+    orders, counting the loads it already has. Infinite distances mark
+    restaurants that cannot take the order. Returns (row, column) pairs.
+    """
+    rows, columns = np.nonzero(np.isfinite(distances))
+    by_distance = np.argsort(distances[rows, columns], kind='stable')
+
+    loads = np.array(loads, dtype=np.int64)
+    assigned_rows = np.zeros(distances.shape[0], dtype=bool)
+    assignments = []
+    for pair in by_distance:
+        row, column = rows[pair], columns[pair]
+        if assigned_rows[row] or loads[column] >= cap:
+            continue
+        assigned_rows[row] = True
+        loads[column] += 1
+        assignments.append((int(row), int(column)))
+        if len(assignments) == distances.shape[0]:
+            break
+    return assignments
+
+
+def get_restaurant_loads():
+    return dict(
+        Order.objects.active()
+        .filter(chosen_restaurant__isnull=False)
+        .values_list('chosen_restaurant')
+        .annotate(orders_count=Count('id'))
+    )
+
+
+def assign_restaurants(cap, limit=None, dry_run=False):
+    """Choose restaurants for unprocessed orders that have none yet.
+
+    Candidates come from the stored OrderRestaurantDistance rows, so
+    orders whose addresses are not geocoded yet wait for the next run.
+    Returns a list of (order, restaurant_id, km) for the assignments made.
+    """
+    orders = list(
+        Order.objects.filter(
+            status=Order.NOT_PROCESSED,
+            chosen_restaurant__isnull=True,
+        ).order_by('registered_at')[:limit]
+    )
+    if not orders:
+        return []
+
+    stored_distances = get_order_distances([order.id for order in orders])
+    located_orders = [order for order in orders if order.id in stored_distances]
+    if not located_orders:
+        return []
+
+    restaurant_ids = sorted({
+        restaurant_id
+        for order_distances in stored_distances.values()
+        for restaurant_id, _, _ in order_distances
+    })
+    columns = {
+        restaurant_id: column
+        for column, restaurant_id in enumerate(restaurant_ids)
+    }
+    distances = np.full((len(located_orders), len(restaurant_ids)), np.inf)
+    for row, order in enumerate(located_orders):
+        for restaurant_id, _, distance_km in stored_distances[order.id]:
+            distances[row, columns[restaurant_id]] = distance_km
+
+    current_loads = get_restaurant_loads()
+    loads = [
+        current_loads.get(restaurant_id, 0)
+        for restaurant_id in restaurant_ids
+    ]
+    planned = {
+        located_orders[row].id: (
+            restaurant_ids[column],
+            float(distances[row, column]),
+        )
+        for row, column in plan_assignments(distances, loads, cap)
+    }
+    if dry_run or not planned:
+        return [
+            (order, *planned[order.id])
+            for order in located_orders
+            if order.id in planned
+        ]
+
+    now = timezone.now()
+    with transaction.atomic():
+        still_pending = list(
+            Order.objects.select_for_update().filter(
+                id__in=planned.keys(),
+                status=Order.NOT_PROCESSED,
+                chosen_restaurant__isnull=True,
+            )
+        )
+        for order in still_pending:
+            order.chosen_restaurant_id = planned[order.id][0]
+            order.updated_at = now
+        Order.objects.bulk_update(
+            still_pending,
+            ['chosen_restaurant', 'updated_at'],
+        )
+
+    logger.info('Assigned restaurants to %s orders', len(still_pending))
+    return [(order, *planned[order.id]) for order in still_pending]
@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+class RestaurantAvailability:
+    """Which restaurants can cook a set of products.
+
+    Every restaurant gets a bit and every product a mask of the
+    restaurants that have it available, so the restaurants able to cook
+    a whole order are the AND of its products' masks.
+    """
+
+    def __init__(self, menu_items):
+        self.restaurant_ids = []
+        self.product_masks = defaultdict(int)
+        restaurant_bits = {}
+        for product_id, restaurant_id in menu_items:
+            if restaurant_id not in restaurant_bits:
+                restaurant_bits[restaurant_id] = len(self.restaurant_ids)
+                self.restaurant_ids.append(restaurant_id)
+            self.product_masks[product_id] |= (
+                1 << restaurant_bits[restaurant_id]
+            )
+
+    @classmethod
+    def load(cls):
+        from .models import RestaurantMenuItem
+
+        return cls(
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('product_id', 'restaurant_id')
+        )
+
+    def get_mask(self, product_ids):
+        if not product_ids:
+            return 0
+        mask = -1
+        for product_id in product_ids:
+            mask &= self.product_masks.get(product_id, 0)
+            if not mask:
+                break
+        return mask
+
+    def get_restaurant_ids(self, product_ids):
+        mask = self.get_mask(product_ids)
+        restaurant_ids = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurant_ids.append(
+                self.restaurant_ids[lowest_bit.bit_length() - 1]
+            )
+            mask ^= lowest_bit
+        return restaurant_ids
+
+
+class MenuMatrix:
+    """Dense product × restaurant availability grid.
+
+    Rows follow the sorted product ids and columns the sorted restaurant
+    ids that appear in the menu, so any ordering of products and
+    restaurants can be cut out of it with a single fancy index.
+
+    The grid is pickled as packed bits: a bool per byte would make a
+    500 × 2,000 menu exceed memcached's default 1 MB item size.
+    """
+
+    def __init__(self, menu_items):
+        menu_items = np.array(list(menu_items), dtype=np.int64).reshape(-1, 3)
+        self.product_ids, rows = np.unique(
+            menu_items[:, 0], return_inverse=True
+        )
+        self.restaurant_ids, columns = np.unique(
+            menu_items[:, 1], return_inverse=True
+        )
+        self.grid = np.zeros(
+            (len(self.product_ids), len(self.restaurant_ids)),
+            dtype=bool,
+        )
+        self.grid[rows, columns] = menu_items[:, 2].astype(bool)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['grid'] = (np.packbits(self.grid, axis=1), self.grid.shape[1])
+        return state
+
+    def __setstate__(self, state):
+        packed_grid, columns_count = state.pop('grid')
+        self.__dict__.update(state)
+        self.grid = np.unpackbits(
+            packed_grid, axis=1, count=columns_count
+        ).astype(bool)
+
+    @classmethod
+    def load(cls):
+        from .models import RestaurantMenuItem
+
+        return cls(
+            RestaurantMenuItem.objects.values_list(
+                'product_id', 'restaurant_id', 'availability'
+            )
+        )
+
+    @staticmethod
+    def _positions(known_ids, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(known_ids, ids)
+        positions = np.minimum(positions, max(len(known_ids) - 1, 0))
+        found = np.zeros(len(ids), dtype=bool)
+        if len(known_ids):
+            found = known_ids[positions] == ids
+        return positions, found
+
+    def get_grid(self, product_ids, restaurant_ids):
+        """Availability for the given products (rows) and restaurants."""
+        rows, known_rows = self._positions(self.product_ids, product_ids)
+        columns, known_columns = self._positions(
+            self.restaurant_ids, restaurant_ids
+        )
+        grid = np.zeros((len(rows), len(columns)), dtype=bool)
+        if self.grid.size:
+            grid = self.grid[np.ix_(rows, columns)]
+        return grid & known_rows[:, np.newaxis] & known_columns
@@ -0,0 +1,189 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .availability import MenuMatrix
+from .models import Banner, Product, Restaurant, RestaurantMenuItem
+from .renderers import compress, dump_json
+
+
+def get_cache_version(name):
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        timeout = settings.CATALOGUE_CACHE_TIMEOUT
+        if not cache.add(key, version, timeout=timeout):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(name):
+    """Make every payload cached under the name's version stale.
+
+    The version is a random token rather than a counter, so an evicted
+    key can never bring an old payload back to life. The bump waits for
+    the current transaction to commit: bumped earlier, a concurrent
+    request could cache rows that are not visible yet under the new
+    version.
+    """
+    transaction.on_commit(lambda: cache.set(
+        f'{name}:version',
+        uuid.uuid4().hex,
+        timeout=settings.CATALOGUE_CACHE_TIMEOUT,
+    ))
+
+
+def bump_catalogue_version(**kwargs):
+    bump_cache_version('catalogue')
+
+
+def bump_banners_version(**kwargs):
+    bump_cache_version('banners')
+
+
+def bump_menu_version(**kwargs):
+    bump_cache_version('menu')
+
+
+def bump_products_version(**kwargs):
+    bump_cache_version('products')
+
+
+def bump_restaurant_menu_version(restaurant_id):
+    bump_cache_version(f'restaurant_menu:{restaurant_id}')
+
+
+def dump_products():
+    products = Product.objects.select_related('category').available()
+
+    dumped_products = []
+    for product in products:
+        dumped_product = dump_product(product)
+        dumped_product['restaurant'] = {
+            'id': product.id,
+            'name': product.name,
+        }
+        dumped_products.append(dumped_product)
+    return dumped_products
+
+
+def dump_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+    }
+
+
+def get_cached_payload(key, dump):
+    """Return the encoded data from dump() and its ETag, cached under key.
+
+    The payload is built only on a cache miss; dump may return None for
+    data that does not exist, which is returned as is and not cached.
+    """
+    payload = cache.get(key)
+    if payload is None:
+        data = dump()
+        if data is None:
+            return None
+        body = dump_json(data)
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        payload = (compress(body), etag)
+        cache.set(key, payload, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return payload
+
+
+def get_products_payload():
+    """Return the encoded product list and its ETag.
+
+    Both are cached under the current catalogue version and rebuilt
+    only after a product, category or menu item changes.
+    """
+    key = f'catalogue:{get_cache_version("catalogue")}:products'
+    return get_cached_payload(key, dump_products)
+
+
+def dump_restaurant_menu(restaurant_id):
+    """Dump what a restaurant can cook now, or None if it does not exist.
+
+    The menu, its products and categories and the restaurant itself
+    come from one joined query; only an empty menu needs a second one
+    to tell a restaurant without dishes from a missing restaurant.
+    """
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(restaurant_id=restaurant_id, availability=True)
+        .select_related('restaurant', 'product__category')
+        .order_by('product_id')
+    )
+    restaurant = None
+    products = []
+    for menu_item in menu_items:
+        restaurant = menu_item.restaurant
+        products.append(dump_product(menu_item.product))
+
+    if restaurant is None:
+        restaurant = Restaurant.objects.filter(pk=restaurant_id).first()
+        if restaurant is None:
+            return None
+    return {
+        'restaurant': {
+            'id': restaurant.id,
+            'name': restaurant.name,
+        },
+        'products': products,
+    }
+
+
+def get_restaurant_menu_payload(restaurant_id):
+    """Return the encoded menu of a restaurant and its ETag, or None.
+
+    Every restaurant has its own cache version, so a change to one menu
+    leaves the cached menus of the other restaurants intact. Product and
+    category changes bump the shared products version instead.
+    """
+    key = 'restaurant_menu:{}:{}:{}'.format(
+        restaurant_id,
+        get_cache_version(f'restaurant_menu:{restaurant_id}'),
+        get_cache_version('products'),
+    )
+    return get_cached_payload(
+        key, lambda: dump_restaurant_menu(restaurant_id)
+    )
+
+
+def dump_banners():
+    return [
+        {
+            'title': banner.title,
+            'src': banner.image.url,
+            'text': banner.text,
+        }
+        for banner in Banner.objects.filter(is_active=True)
+    ]
+
+
+def get_banners_payload():
+    key = f'banners:{get_cache_version("banners")}'
+    return get_cached_payload(key, dump_banners)
+
+
+def get_menu_matrix():
+    """Return the MenuMatrix, rebuilt only after a menu item changes."""
+    key = f'menu:{get_cache_version("menu")}:matrix'
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = MenuMatrix.load()
+        cache.set(key, matrix, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return matrix
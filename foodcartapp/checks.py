@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when production runs on a per-process cache.
+
+    Catalogue caches are invalidated by version bumps, and a bump in
+    a per-process cache reaches only the worker that made the change.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or not backend.endswith('LocMemCache'):
+        return []
+    return [
+        Warning(
+            'Кэш хранится в памяти процесса',
+            hint=(
+                'Укажите общий для всех воркеров кэш в CACHE_URL, иначе '
+                'изменения меню дойдут до остальных воркеров только через '
+                'CATALOGUE_CACHE_TIMEOUT секунд'
+            ),
+            id='foodcartapp.W001',
+        )
+    ]
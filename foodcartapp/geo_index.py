@@ -0,0 +1,239 @@
+import logging
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from django.conf import settings
+from django.utils import timezone
+
+from geodata.distances import EARTH_RADIUS_KM, cover_boxes, haversine_matrix
+from geodata.geocoder import enqueue_addresses
+from geodata.models import PlaceGeolocation
+
+from .catalogue import bump_cache_version, get_cache_version
+from .models import Restaurant
+
+
+logger = logging.getLogger(__name__)
+
+GEO_INDEX_CACHE_NAME = 'restaurant_geo'
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+class RestaurantGeoIndex:
+    """Uniform lon/lat grid over restaurant locations.
+
+    Nearest-neighbour queries walk square rings of cells around the
+    query point and stop as soon as the k-th candidate is closer than
+    anything outside the rings can be. Far away queries, where rings
+    would get large, fall back to one vectorised pass over all points.
+    """
+
+    MAX_RINGS = 16
+
+    def __init__(self, restaurant_ids, coordinates, cell_size=0.05):
+        self.restaurant_ids = np.asarray(restaurant_ids, dtype=np.int64)
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.cell_size = cell_size
+        self.positions = {
+            restaurant_id: position
+            for position, restaurant_id in enumerate(restaurant_ids)
+        }
+
+        cells = {}
+        cell_keys = np.floor(self.coordinates / cell_size).astype(np.int64)
+        for position, (cell_x, cell_y) in enumerate(cell_keys.tolist()):
+            cells.setdefault((cell_x, cell_y), []).append(position)
+        self.cells = {
+            cell: np.array(positions, dtype=np.int64)
+            for cell, positions in cells.items()
+        }
+
+    def __len__(self):
+        return len(self.restaurant_ids)
+
+    def get_coordinates(self, restaurant_id):
+        position = self.positions.get(restaurant_id)
+        if position is None:
+            return None
+        lon, lat = self.coordinates[position]
+        return float(lon), float(lat)
+
+    def _ring(self, cell_x, cell_y, radius):
+        if not radius:
+            cell = self.cells.get((cell_x, cell_y))
+            return [cell] if cell is not None else []
+
+        found = []
+        for dx in range(-radius, radius + 1):
+            for dy in (-radius, radius):
+                cell = self.cells.get((cell_x + dx, cell_y + dy))
+                if cell is not None:
+                    found.append(cell)
+        for dy in range(-radius + 1, radius):
+            for dx in (-radius, radius):
+                cell = self.cells.get((cell_x + dx, cell_y + dy))
+                if cell is not None:
+                    found.append(cell)
+        return found
+
+    def _unseen_distance(self, lon, lat, cell_x, cell_y, radius):
+        """Lower bound in km for points outside the searched square."""
+        lat_gap = min(
+            lat - (cell_y - radius) * self.cell_size,
+            (cell_y + radius + 1) * self.cell_size - lat,
+        )
+        lon_gap = min(
+            lon - (cell_x - radius) * self.cell_size,
+            (cell_x + radius + 1) * self.cell_size - lon,
+        )
+        lat_bound = EARTH_RADIUS_KM * np.radians(lat_gap)
+        lon_bound = EARTH_RADIUS_KM * np.arcsin(
+            np.cos(np.radians(lat)) * np.sin(np.radians(min(lon_gap, 90)))
+        )
+        return min(lat_bound, lon_bound)
+
+    def _rank(self, lon, lat, positions, k):
+        distances = haversine_matrix([(lon, lat)], self.coordinates[positions])[0]
+        order = np.argsort(distances)[:k]
+        return [
+            (int(self.restaurant_ids[positions[index]]), float(distances[index]))
+            for index in order
+        ]
+
+    def _filter(self, positions, allowed):
+        if allowed is None:
+            return positions
+        return positions[np.isin(self.restaurant_ids[positions], allowed)]
+
+    def nearest(self, lon, lat, k=5, restaurant_ids=None):
+        """Return up to k (restaurant_id, km) pairs, closest first.
+
+        When restaurant_ids is given only those restaurants are considered,
+        e.g. the ones able to cook an order.
+        """
+        if not len(self) or k <= 0:
+            return []
+        allowed = None
+        if restaurant_ids is not None:
+            allowed = np.fromiter(restaurant_ids, dtype=np.int64)
+            if not allowed.size:
+                return []
+
+        cell_x = int(np.floor(lon / self.cell_size))
+        cell_y = int(np.floor(lat / self.cell_size))
+        candidates = []
+        for radius in range(self.MAX_RINGS + 1):
+            candidates.extend(
+                self._filter(cell, allowed)
+                for cell in self._ring(cell_x, cell_y, radius)
+            )
+            positions = (
+                np.concatenate(candidates) if candidates
+                else np.empty(0, dtype=np.int64)
+            )
+            if len(positions) < k:
+                continue
+            ranked = self._rank(lon, lat, positions, k)
+            if ranked[-1][1] <= self._unseen_distance(
+                lon, lat, cell_x, cell_y, radius
+            ):
+                return ranked
+
+        positions = self._filter(np.arange(len(self)), allowed)
+        if not len(positions):
+            return []
+        return self._rank(lon, lat, positions, k)
+
+    @classmethod
+    def load(cls):
+        """Index the restaurants whose addresses are already geocoded.
+
+        Nothing is fetched here: addresses never geocoded, misses older
+        than GEOCODER_MISS_TTL and places older than GEOCODER_HIT_TTL
+        are queued for geocode_worker. Once it saves them the index is
+        invalidated and picks them up on the next load.
+        """
+        restaurants = list(Restaurant.objects.values_list('id', 'address'))
+        now = timezone.now()
+        miss_expires_at = now - timedelta(seconds=settings.GEOCODER_MISS_TTL)
+        hit_expires_at = now - timedelta(seconds=settings.GEOCODER_HIT_TTL)
+
+        places = {}
+        due = {address for _, address in restaurants if address}
+        stored_places = PlaceGeolocation.objects.filter(
+            address__in=due
+        ).values_list('address', 'lon', 'lat', 'last_update')
+        for address, lon, lat, last_update in stored_places:
+            if lon is None or lat is None:
+                if last_update > miss_expires_at:
+                    due.discard(address)
+                continue
+            places[address] = (lon, lat)
+            if last_update >= hit_expires_at:
+                due.discard(address)
+
+        located = [
+            (restaurant_id, places[address])
+            for restaurant_id, address in restaurants
+            if address in places
+        ]
+        if len(located) < len(restaurants):
+            logger.warning(
+                'Locations of %s restaurants are not known',
+                len(restaurants) - len(located),
+            )
+        enqueue_addresses(due)
+        return cls(
+            [restaurant_id for restaurant_id, _ in located],
+            [coordinates for _, coordinates in located],
+        )
+
+    @classmethod
+    def load_nearby(cls, origins, radius_km):
+        """Index of the restaurants around the given (lon, lat) origins.
+
+        Restaurant places are pre-filtered in SQL by boxes that cover
+        radius_km around clusters of origins, using the (lat, lon) index,
+        so orders in different cities read only the restaurants around
+        each of them.
+        """
+        if not origins:
+            return cls([], [])
+        nearby_places = (
+            PlaceGeolocation.objects
+            .in_boxes(cover_boxes(origins, radius_km))
+            .filter(address__in=Restaurant.objects.values('address'))
+            .values_list('address', 'lon', 'lat')
+        )
+        places = {address: (lon, lat) for address, lon, lat in nearby_places}
+        restaurants = Restaurant.objects.filter(
+            address__in=places.keys()
+        ).values_list('id', 'address')
+        return cls(
+            [restaurant_id for restaurant_id, _ in restaurants],
+            [places[address] for _, address in restaurants],
+        )
+
+
+def get_restaurant_geo_index():
+    """Return the process-wide index, reloading it after it was invalidated.
+
+    The version is read before loading, so an invalidation that lands
+    while the index is being built makes the next call load it again.
+    """
+    global _index, _index_version
+    version = get_cache_version(GEO_INDEX_CACHE_NAME)
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index = RestaurantGeoIndex.load()
+            _index_version = version
+        return _index
+
+
+def invalidate_restaurant_geo_index(**kwargs):
+    bump_cache_version(GEO_INDEX_CACHE_NAME)
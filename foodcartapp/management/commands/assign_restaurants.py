@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.assignment import assign_restaurants
+
+
+class Command(BaseCommand):
+    help = 'Назначает рестораны необработанным заказам, начиная с ближайших'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cap',
+            type=int,
+            default=settings.RESTAURANT_LOAD_CAP,
+            help='сколько незавершённых заказов может быть у ресторана',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='сколько заказов обрабатывать за раз',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='только показать назначения, ничего не сохраняя',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='повторять каждые N секунд',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            assignments = assign_restaurants(
+                options['cap'],
+                limit=options['limit'],
+                dry_run=options['dry_run'],
+            )
+            for order, restaurant_id, distance in assignments:
+                self.stdout.write(
+                    f'Заказ {order.id}: ресторан {restaurant_id}, '
+                    f'{distance:.3f} км'
+                )
+            self.stdout.write(f'Назначено заказов: {len(assignments)}')
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
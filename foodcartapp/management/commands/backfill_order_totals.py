@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённую стоимость заказов по их позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='сколько заказов пересчитывать одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Order.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        updated = 0
+        for first_id in range(0, last_id + 1, batch_size):
+            updated += Order.objects.filter(
+                id__gte=first_id,
+                id__lt=first_id + batch_size,
+            ).update_total_prices()
+        self.stdout.write(f'Пересчитано заказов: {updated}')
@@ -0,0 +1,77 @@
+import gzip
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.renderers import brotli, dumps_orjson, dumps_stdlib, orjson
+
+
+def make_catalogue(size):
+    return [
+        {
+            'id': product_id,
+            'name': f'Бургер №{product_id}',
+            'price': Decimal(f'{100 + product_id % 900}.50'),
+            'special_status': product_id % 7 == 0,
+            'description': 'Сочная котлета, свежие овощи и фирменный соус',
+            'category': {
+                'id': product_id % 12,
+                'name': f'Категория {product_id % 12}',
+            },
+            'image': f'/media/product_{product_id}.jpg',
+            'restaurant': {
+                'id': product_id,
+                'name': f'Бургер №{product_id}',
+            }
+        }
+        for product_id in range(1, size + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает размер и скорость сериализации каталога товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=1000,
+            help='сколько товаров в каталоге',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='сколько раз сериализовать каталог',
+        )
+
+    def handle(self, *args, **options):
+        catalogue = make_catalogue(options['products'])
+        variants = [
+            ('stdlib, indent=4', dumps_stdlib, 4),
+            ('stdlib, compact', dumps_stdlib, None),
+        ]
+        if orjson is not None:
+            variants.append(('orjson, compact', dumps_orjson, None))
+
+        header = '{:<18} {:>10} {:>10} {:>10} {:>12}'.format(
+            'encoder', 'bytes', 'gzip', 'brotli', 'median, ms'
+        )
+        self.stdout.write(header)
+        for name, dumps, indent in variants:
+            timings = []
+            for _ in range(options['repeat']):
+                started_at = time.perf_counter()
+                body = dumps(catalogue, indent=indent)
+                timings.append(time.perf_counter() - started_at)
+
+            brotli_size = len(brotli.compress(body)) if brotli else '-'
+            self.stdout.write('{:<18} {:>10} {:>10} {:>10} {:>12.2f}'.format(
+                name,
+                len(body),
+                len(gzip.compress(body)),
+                brotli_size,
+                statistics.median(timings) * 1000,
+            ))
@@ -0,0 +1,258 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from foodcartapp.models import Order, Product, Restaurant
+from foodcartapp.seeding import seed_load
+from star_burger.nplusone import fingerprint_queries, format_repeats
+
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'views_baseline.json'
+)
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench_views',
+    },
+}
+# Large enough for per-order queries to stand out as N+1.
+BATCH_SIZE = 10
+# The debug toolbar adds its own queries and time to every response.
+BENCH_MIDDLEWARE = [
+    middleware
+    for middleware in settings.MIDDLEWARE
+    if not middleware.startswith('debug_toolbar.')
+]
+
+
+def parse_scale(value):
+    try:
+        restaurants, products, orders = (int(part) for part in value.split('x'))
+    except ValueError:
+        raise CommandError(
+            f'Масштаб {value!r} нужно указать как рестораны x товары x заказы'
+        )
+    return restaurants, products, orders
+
+
+def get_batch_size():
+    """Orders per batch request.
+
+    Without ids returned from bulk inserts, e.g. on SQLite, create_orders
+    saves orders one by one on purpose, so there a batch of one order
+    keeps the N+1 check meaningful for the rest of the request.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return BATCH_SIZE
+    return 1
+
+
+def get_endpoints():
+    product_id = Product.objects.available().values_list('id', flat=True)[0]
+    restaurant_id = Restaurant.objects.values_list('id', flat=True)[0]
+    address = Order.objects.values_list('address', flat=True)[0]
+    order = {
+        'products': [{'product': product_id, 'quantity': 2}],
+        'firstname': 'Нагрузка',
+        'lastname': 'Тест',
+        'phonenumber': '+79291000000',
+        'address': address,
+    }
+    return [
+        ('view_orders', 'get', '/manager/orders/', None),
+        (
+            'view_orders_changes',
+            'get',
+            '/manager/orders/changes/?since=2000-01-01T00:00:00%2B00:00',
+            None,
+        ),
+        ('view_products', 'get', '/manager/products/', None),
+        ('view_restaurants', 'get', '/manager/restaurants/', None),
+        ('admin_orders', 'get', '/admin/foodcartapp/order/', None),
+        ('banners_list_api', 'get', '/api/banners/', None),
+        ('product_list_api', 'get', '/api/products/', None),
+        (
+            'restaurant_menu_api',
+            'get',
+            f'/api/restaurants/{restaurant_id}/menu/',
+            None,
+        ),
+        ('register_order', 'post', '/api/order/', json.dumps(order)),
+        (
+            'register_orders_batch',
+            'post',
+            '/api/orders/batch/',
+            json.dumps([order] * get_batch_size()),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа и число SQL-запросов основных страниц и API '
+        'на синтетических данных и сравнивает число запросов с сохранённым'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            nargs='+',
+            default=['10x50x200', '50x200x1000', '200x500x5000'],
+            help='масштабы данных в виде рестораны x товары x заказы',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='сколько раз запрашивать каждую страницу',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=DEFAULT_BASELINE,
+            help='файл с результатами, с которыми сравнивать',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='записать результаты в файл вместо сравнения',
+        )
+        parser.add_argument(
+            '--n-plus-one-threshold',
+            type=int,
+            default=5,
+            help='сколько раз за ответ может повторяться один SQL-запрос',
+        )
+
+    def handle(self, *args, **options):
+        scales = [parse_scale(scale) for scale in options['scales']]
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            DEBUG=False,
+            MIDDLEWARE=BENCH_MIDDLEWARE,
+            CACHES=BENCH_CACHES,
+            MEDIA_ROOT=media_root,
+        ):
+            connection.creation.create_test_db(
+                verbosity=0,
+                autoclobber=True,
+                serialize=False,
+            )
+            try:
+                results = {
+                    'x'.join(map(str, scale)): self.bench_scale(
+                        scale,
+                        options['repeat'],
+                        options['n_plus_one_threshold'],
+                    )
+                    for scale in scales
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        query_counts = {
+            scale: {name: result['queries'] for name, result in endpoints.items()}
+            for scale, endpoints in results.items()
+        }
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(query_counts, baseline_file, indent=2, sort_keys=True)
+                baseline_file.write('\n')
+            self.stdout.write(f'Результаты записаны в {options["baseline"]}')
+            return
+
+        if not os.path.exists(options['baseline']):
+            raise CommandError(
+                f'Нет файла {options["baseline"]}, '
+                'запустите команду с --save-baseline'
+            )
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = self.compare(query_counts, baseline)
+        if regressions:
+            raise CommandError(
+                'SQL-запросов стало больше:\n' + '\n'.join(regressions)
+            )
+
+    def bench_scale(self, scale, repeat, n_plus_one_threshold):
+        restaurants, products, orders = scale
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        seed_load(restaurants, products, orders, seed=0)
+
+        manager = get_user_model().objects.create_superuser(
+            'bench', password='bench'
+        )
+        client = Client()
+        client.force_login(manager)
+
+        results = {}
+        for name, method, url, body in get_endpoints():
+            request = getattr(client, method)
+            kwargs = {'content_type': 'application/json'} if body else {}
+            request(url, body, **kwargs)
+            with fingerprint_queries(n_plus_one_threshold) as fingerprinter:
+                request(url, body, **kwargs)
+            repeats = fingerprinter.get_repeats()
+            if repeats:
+                raise CommandError(
+                    f'{url} повторяет SQL-запросы:\n{format_repeats(repeats)}'
+                )
+
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as context:
+                    started_at = time.perf_counter()
+                    response = request(url, body, **kwargs)
+                    timings.append(time.perf_counter() - started_at)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url} ответил {response.status_code}'
+                    )
+                queries = max(queries, len(context))
+
+            results[name] = {
+                'ms': round(statistics.median(timings) * 1000, 2),
+                'queries': queries,
+            }
+            self.stdout.write('{:<16} {:<20} {:>10.2f} ms {:>5} SQL'.format(
+                'x'.join(map(str, scale)),
+                name,
+                results[name]['ms'],
+                queries,
+            ))
+        return results
+
+    def compare(self, query_counts, baseline):
+        """Timings depend on the machine, so only query counts are gated."""
+        regressions = []
+        for scale, endpoints in query_counts.items():
+            for name, queries in endpoints.items():
+                expected = baseline.get(scale, {}).get(name)
+                if expected is not None and queries > expected:
+                    regressions.append(
+                        f'{scale} {name}: {queries} SQL-запросов '
+                        f'вместо {expected}'
+                    )
+        return regressions
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.models import Product, RestaurantMenuItem
+
+
+class Command(BaseCommand):
+    help = 'Сверяет флаг is_available товаров с меню ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='исправить расхождения',
+        )
+
+    def handle(self, *args, **options):
+        flagged_ids = set(
+            Product.objects.available().values_list('id', flat=True)
+        )
+        actual_ids = set(
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('product_id', flat=True)
+            .distinct()
+        )
+        mismatched_ids = flagged_ids ^ actual_ids
+        if not mismatched_ids:
+            self.stdout.write('Расхождений нет')
+            return
+
+        ids = ', '.join(map(str, sorted(mismatched_ids)))
+        if not options['fix']:
+            raise CommandError(f'Флаг is_available не совпадает с меню: {ids}')
+
+        Product.objects.filter(id__in=mismatched_ids).refresh_availability()
+        self.stdout.write(f'Исправлены товары: {ids}')
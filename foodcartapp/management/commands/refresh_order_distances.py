@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.order_distances import refresh_pending_order_distances
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые расстояния от заказов до ресторанов'
+
+    def handle(self, *args, **options):
+        refreshed = refresh_pending_order_distances()
+        self.stdout.write(f'Пересчитано заказов: {refreshed}')
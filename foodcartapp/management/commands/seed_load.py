@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.seeding import seed_load
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими ресторанами, товарами и заказами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurants',
+            type=int,
+            default=50,
+            help='сколько создать ресторанов',
+        )
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=200,
+            help='сколько создать товаров',
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=1000,
+            help='сколько создать заказов',
+        )
+        parser.add_argument(
+            '--menu-share',
+            type=float,
+            default=0.5,
+            help='какая доля товаров есть в меню каждого ресторана',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='зерно генератора случайных чисел',
+        )
+
+    def handle(self, *args, **options):
+        tag = seed_load(
+            options['restaurants'],
+            options['products'],
+            options['orders'],
+            menu_share=options['menu_share'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f'Созданы данные с меткой {tag}')
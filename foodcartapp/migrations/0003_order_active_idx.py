@@ -0,0 +1,17 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0002_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'FN'), _negated=True), fields=['status', 'registered_at', 'id'], name='order_active_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0004_order_total_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Banner',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50, verbose_name='заголовок')),
+                ('image', models.ImageField(upload_to='', verbose_name='картинка')),
+                ('text', models.CharField(blank=True, max_length=200, verbose_name='текст')),
+                ('position', models.PositiveIntegerField(db_index=True, default=0, verbose_name='позиция')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='показывать')),
+            ],
+            options={
+                'verbose_name': 'баннер',
+                'verbose_name_plural': 'баннеры',
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
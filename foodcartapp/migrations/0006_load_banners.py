@@ -0,0 +1,56 @@
+import logging
+
+from django.contrib.staticfiles import finders
+from django.core.files import File
+from django.db import migrations
+
+BANNERS = [
+    ('Burger', 'burger.jpg', 'Tasty Burger at your door step'),
+    ('Spices', 'food.jpg', 'All Cuisines'),
+    ('New York', 'tasty.jpg', 'Food is incomplete without a tasty dessert'),
+]
+
+logger = logging.getLogger(__name__)
+
+
+def load_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    for position, (title, image_name, text) in enumerate(BANNERS):
+        image_path = finders.find(image_name)
+        if not image_path:
+            logger.warning(
+                'Banner %r is not loaded: static file %s not found',
+                title,
+                image_name,
+            )
+            continue
+        banner = Banner(title=title, text=text, position=position)
+        # Every test database runs this migration, so the image is
+        # copied only once and later runs point at the same file.
+        storage = banner.image.storage
+        if not storage.exists(image_name):
+            with open(image_path, 'rb') as image:
+                storage.save(image_name, File(image))
+        banner.image.name = image_name
+        banner.save()
+
+
+def unload_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    banners = Banner.objects.filter(
+        title__in=[title for title, _, _ in BANNERS]
+    )
+    for banner in banners:
+        banner.image.delete(save=False)
+    banners.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0005_banner'),
+    ]
+
+    operations = [
+        migrations.RunPython(load_banners, unload_banners),
+    ]
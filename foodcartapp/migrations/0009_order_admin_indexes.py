@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:47
+
+from django.db import migrations, models
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0008_orderrestaurantdistance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='payment_type',
+            field=models.CharField(blank=True, choices=[('El', 'Банковской картой'), ('Ca', 'Наличными')], db_index=True, max_length=20, verbose_name='Способ оплаты'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='phonenumber',
+            field=phonenumber_field.modelfields.PhoneNumberField(db_index=True, max_length=128, region='RU', verbose_name='Телефон'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0009_order_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='distances_status',
+            field=models.CharField(choices=[('NC', 'Расстояния ещё не посчитаны'), ('CA', 'Расстояния посчитаны'), ('AN', 'Ошибка определения координат'), ('NR', 'Нет ресторанов, способных приготовить заказ')], default='NC', editable=False, max_length=2, verbose_name='Расстояния до ресторанов'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0010_order_distances_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Завершён'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ['firstname', 'lastname', 'address']
+
+
+def create_search_indexes(apps, schema_editor):
+    # istartswith compiles to UPPER("column"::text) LIKE UPPER(...) || '%'
+    # on PostgreSQL; text_pattern_ops lets the expression index serve LIKE
+    # prefixes whatever the database collation is. Django 3.2 cannot put
+    # an opclass on an expression index, hence the raw SQL.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS order_{field}_upper_idx '
+            f'ON foodcartapp_order (UPPER({field}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS order_{field}_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0011_order_finished_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
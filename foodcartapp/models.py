@@ -1,60 +1,77 @@
-from functools import reduce
+from collections import defaultdict
+from decimal import Decimal
 
 from django.db import models
-from django.db.models import F, Sum, Subquery
+from django.db.models import Exists, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .availability import RestaurantAvailability
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        return self.filter(is_available=True)
+
+    def refresh_availability(self):
+        """Recalculate is_available from the menus in one UPDATE."""
+        return self.update(
+            is_available=Exists(
+                RestaurantMenuItem.objects.filter(
+                    product=OuterRef('pk'),
+                    availability=True,
+                )
+            )
         )
-        return self.filter(pk__in=products)
-
-
-class OrderItemQuerySet(models.QuerySet):
-    def get_item_price(self):
-        return self.annotate(total_price=F('price') * F('quantity'))
 
 
 class OrderQuerySet(models.QuerySet):
-    def get_order_price(self):
-        return self.annotate(total_price=Sum('items__price'))
+    def active(self):
+        return self.exclude(status=Order.FINISHED)
+
+    def pending(self):
+        """Active orders that still wait for a restaurant."""
+        return self.active().filter(chosen_restaurant__isnull=True)
+
+    def update_total_prices(self):
+        """Recalculate the stored total_price of every order in one UPDATE."""
+        items_price = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum('price'))
+            .values('total')
+        )
+        # update() skips auto_now, and the dashboard polls updated_at
+        return self.update(
+            total_price=Coalesce(Subquery(items_price), Value(Decimal(0))),
+            updated_at=timezone.now(),
+        )
+
+    def after(self, status, registered_at, order_id):
+        """Keyset page that follows the given (status, registered_at, id)."""
+        return self.filter(
+            Q(status__gt=status)
+            | Q(status=status, registered_at__gt=registered_at)
+            | Q(status=status, registered_at=registered_at, id__gt=order_id)
+        ).order_by('status', 'registered_at', 'id')
 
     def get_available_restaurants(self):
-        for order in self:
-            order_products = [
-                item.product
-                for item in order.items.all()
-            ]
-            menu_items = [
-                product.menu_items.all()
-                for product in order_products
-            ]
-
-            if not menu_items:
-                order.available_restaurants = []
-                continue
-
-            available_restaurants = []
-            for menu_item in menu_items:
-                restaurants = [
-                    item.restaurant
-                    for item in menu_item
-                ]
-                available_restaurants.append(restaurants)
-
-            order.available_restaurants = list(
-                reduce(
-                    set.intersection,
-                    [set(rest) for rest in available_restaurants]
-                )
+        availability = RestaurantAvailability.load()
+        orders = list(self)
+        order_products = defaultdict(set)
+        ordered_products = OrderItem.objects.filter(
+            order_id__in=[order.id for order in orders]
+        ).values_list('order_id', 'product_id')
+        for order_id, product_id in ordered_products:
+            order_products[order_id].add(product_id)
+
+        for order in orders:
+            order.available_restaurant_ids = set(
+                availability.get_restaurant_ids(order_products[order.id])
             )
 
 
@@ -105,6 +122,13 @@ class Product(models.Model):
         blank=True,
     )
 
+    is_available = models.BooleanField(
+        'есть в продаже',
+        default=False,
+        db_index=True,
+        editable=False,
+    )
+
     objects = ProductQuerySet.as_manager()
 
     class Meta:
@@ -115,6 +139,39 @@ class Product(models.Model):
         return self.name
 
 
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50
+    )
+    image = models.ImageField(
+        'картинка'
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    position = models.PositiveIntegerField(
+        'позиция',
+        default=0,
+        db_index=True,
+    )
+    is_active = models.BooleanField(
+        'показывать',
+        default=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
+
+
 class Restaurant(models.Model):
     name = models.CharField(
         'название',
@@ -178,6 +235,11 @@ class Order(models.Model):
     ELECTRON = 'El'
     CASH = 'Ca'
 
+    DISTANCES_NOT_CALCULATED = 'NC'
+    DISTANCES_CALCULATED = 'CA'
+    ADDRESS_NOT_FOUND = 'AN'
+    NO_CAPABLE_RESTAURANTS = 'NR'
+
     ORDER_STATUSES = [
         (NOT_PROCESSED, 'Необработанный'),
         (PROCESSED, 'Обработанный'),
@@ -189,6 +251,13 @@ class Order(models.Model):
         (CASH, 'Наличными')
     ]
 
+    DISTANCES_STATUSES = [
+        (DISTANCES_NOT_CALCULATED, 'Расстояния ещё не посчитаны'),
+        (DISTANCES_CALCULATED, 'Расстояния посчитаны'),
+        (ADDRESS_NOT_FOUND, 'Ошибка определения координат'),
+        (NO_CAPABLE_RESTAURANTS, 'Нет ресторанов, способных приготовить заказ'),
+    ]
+
     firstname = models.CharField(
         max_length=200,
         verbose_name='Имя'
@@ -199,7 +268,8 @@ class Order(models.Model):
     )
     phonenumber = PhoneNumberField(
         region='RU',
-        verbose_name='Телефон'
+        verbose_name='Телефон',
+        db_index=True
     )
     address = models.CharField(
         max_length=200,
@@ -221,6 +291,11 @@ class Order(models.Model):
         default=timezone.now,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Изменён',
+        auto_now=True,
+        db_index=True
+    )
     processed_at = models.DateTimeField(
         verbose_name='Обработан',
         blank=True,
@@ -231,11 +306,35 @@ class Order(models.Model):
         blank=True,
         null=True
     )
+    finished_at = models.DateTimeField(
+        verbose_name='Завершён',
+        blank=True,
+        null=True,
+        editable=False,
+        db_index=True
+    )
     payment_type = models.CharField(
         max_length=20,
         verbose_name='Способ оплаты',
         choices=PAYMENT_TYPES,
-        blank=True
+        blank=True,
+        db_index=True
+    )
+
+    total_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Стоимость заказа',
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
+
+    distances_status = models.CharField(
+        max_length=2,
+        verbose_name='Расстояния до ресторанов',
+        choices=DISTANCES_STATUSES,
+        default=DISTANCES_NOT_CALCULATED,
+        editable=False
     )
 
     chosen_restaurant = models.ForeignKey(
@@ -253,6 +352,19 @@ class Order(models.Model):
         verbose_name = 'Заказ',
         verbose_name_plural = 'Заказы'
         ordering = ['status', 'registered_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'registered_at', 'id'],
+                name='order_active_idx',
+                condition=~Q(status='FN'),
+            ),
+        ]
+
+    def update_total_price(self):
+        self.total_price = self.items.aggregate(
+            total=Coalesce(Sum('price'), Value(Decimal(0)))
+        )['total']
+        self.save(update_fields=['total_price', 'updated_at'])
 
 
 class OrderItem(models.Model):
@@ -278,4 +390,37 @@ class OrderItem(models.Model):
         verbose_name='Цена позиции',
         validators=[MinValueValidator(0)]
     )
-    objects = OrderItemQuerySet.as_manager()
+
+
+class OrderRestaurantDistance(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='restaurant_distances',
+        verbose_name='Заказ'
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='order_distances',
+        verbose_name='Ресторан'
+    )
+    distance_km = models.FloatField(
+        verbose_name='Расстояние, км'
+    )
+
+    class Meta:
+        verbose_name = 'расстояние до ресторана'
+        verbose_name_plural = 'расстояния до ресторанов'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(
+                fields=['order', 'distance_km'],
+                name='order_distance_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.restaurant_id}: {self.distance_km:.3f} км"
@@ -0,0 +1,204 @@
+import logging
+import threading
+from collections import defaultdict
+from functools import partial
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from geodata.distances import haversine_matrix, refine_nearest
+from geodata.geocoder import get_known_coordinates
+from geodata.models import PlaceGeolocation
+
+from .geo_index import RestaurantGeoIndex, get_restaurant_geo_index
+from .models import Order, OrderRestaurantDistance
+
+
+logger = logging.getLogger(__name__)
+
+REFRESH_CHUNK_SIZE = 500
+
+_scheduled = threading.local()
+
+
+def get_capable_distances(orders, places, geo_index):
+    """Distances from located orders to every restaurant of the index.
+
+    Orders must carry available_restaurant_ids. Restaurants that cannot
+    cook an order get an infinite distance. Returns the located orders
+    and the (orders × restaurants) matrix in km.
+    """
+    located_orders = [order for order in orders if order.address in places]
+    if not located_orders or not len(geo_index):
+        return [], np.empty((0, len(geo_index)))
+
+    origins = [places[order.address] for order in located_orders]
+    distances = haversine_matrix(origins, geo_index.coordinates)
+    capable = np.zeros(distances.shape, dtype=bool)
+    for row, order in enumerate(located_orders):
+        capable[row, [
+            geo_index.positions[restaurant_id]
+            for restaurant_id in order.available_restaurant_ids
+            if restaurant_id in geo_index.positions
+        ]] = True
+    distances[~capable] = np.inf
+
+    refine_nearest(
+        distances,
+        origins,
+        geo_index.coordinates,
+        settings.DISTANCE_GEODESIC_TOP_K,
+    )
+    return located_orders, distances
+
+
+def get_distances_statuses(orders, places, rows):
+    """Group order ids by the distances_status they get after a refresh.
+
+    Orders whose address has not reached geocode_worker yet stay not
+    calculated: the worker refreshes them once it stores the address.
+    """
+    ordered_ids = {row.order_id for row in rows}
+    unlocated = {order.address for order in orders} - places.keys()
+    attempted = set(
+        PlaceGeolocation.objects
+        .filter(address__in=unlocated)
+        .values_list('address', flat=True)
+    )
+    statuses = defaultdict(list)
+    for order in orders:
+        if order.id in ordered_ids:
+            status = Order.DISTANCES_CALCULATED
+        elif order.address in places:
+            status = Order.NO_CAPABLE_RESTAURANTS
+        elif order.address in attempted:
+            status = Order.ADDRESS_NOT_FOUND
+        else:
+            status = Order.DISTANCES_NOT_CALCULATED
+        statuses[status].append(order.id)
+    return statuses
+
+
+def refresh_order_distances(orders):
+    """Recalculate the stored distances of a queryset of orders.
+
+    Only places that are already geocoded are used, so orders waiting
+    for geocode_worker are left without rows until it resolves their
+    addresses. With DELIVERY_RADIUS_KM set only restaurants within that
+    radius are read and stored. Every order gets a distances_status, so
+    orders without rows are not recalculated until something changes.
+    Returns the new rows.
+    """
+    orders.get_available_restaurants()
+    orders = list(orders)
+    if not orders:
+        return []
+    places = get_known_coordinates(order.address for order in orders)
+
+    radius_km = settings.DELIVERY_RADIUS_KM
+    if radius_km:
+        geo_index = RestaurantGeoIndex.load_nearby(
+            [places[order.address] for order in orders if order.address in places],
+            radius_km,
+        )
+    else:
+        geo_index = get_restaurant_geo_index()
+    located_orders, distances = get_capable_distances(
+        orders,
+        places,
+        geo_index,
+    )
+    if radius_km:
+        distances[distances > radius_km] = np.inf
+    rows = []
+    for order, order_distances in zip(located_orders, distances):
+        for column in np.flatnonzero(np.isfinite(order_distances)):
+            rows.append(OrderRestaurantDistance(
+                order_id=order.id,
+                restaurant_id=int(geo_index.restaurant_ids[column]),
+                distance_km=float(order_distances[column]),
+            ))
+    statuses = get_distances_statuses(orders, places, rows)
+
+    with transaction.atomic():
+        OrderRestaurantDistance.objects.filter(
+            order_id__in=[order.id for order in orders]
+        ).delete()
+        OrderRestaurantDistance.objects.bulk_create(rows)
+        for status, order_ids in statuses.items():
+            # update() skips auto_now, and the dashboard polls updated_at
+            Order.objects.filter(id__in=order_ids).update(
+                distances_status=status,
+                updated_at=timezone.now(),
+            )
+    return rows
+
+
+def refresh_pending_order_distances(orders=None):
+    """Refresh distances of pending orders chunk by chunk."""
+    if orders is None:
+        orders = Order.objects.all()
+    order_ids = list(
+        orders.pending().order_by('id').values_list('id', flat=True).distinct()
+    )
+    for start in range(0, len(order_ids), REFRESH_CHUNK_SIZE):
+        refresh_order_distances(
+            Order.objects.filter(
+                id__in=order_ids[start:start + REFRESH_CHUNK_SIZE]
+            )
+        )
+    if order_ids:
+        logger.info('Refreshed restaurant distances of %s orders', len(order_ids))
+    return len(order_ids)
+
+
+def refresh_distances_on_commit(product_ids=None):
+    """Refresh distances of pending orders after the transaction commits.
+
+    Calls made within one transaction, e.g. by an admin inline saving
+    many menu items, are merged: only the callback registered last does
+    the work, after the cache bumps registered before it. Without
+    product_ids all pending orders are refreshed.
+    """
+    if not hasattr(_scheduled, 'product_ids'):
+        _scheduled.product_ids = set()
+        _scheduled.all_orders = False
+    if product_ids is None:
+        _scheduled.all_orders = True
+    else:
+        _scheduled.product_ids.update(product_ids)
+    _scheduled.token = token = object()
+    transaction.on_commit(partial(_run_scheduled_refresh, token))
+
+
+def _run_scheduled_refresh(token):
+    if token is not _scheduled.token:
+        return
+    product_ids, all_orders = _scheduled.product_ids, _scheduled.all_orders
+    _scheduled.product_ids, _scheduled.all_orders = set(), False
+    if all_orders:
+        refresh_pending_order_distances()
+    elif product_ids:
+        refresh_pending_order_distances(
+            Order.objects.filter(items__product_id__in=product_ids)
+        )
+
+
+def get_order_distances(order_ids):
+    """Read stored distances as {order_id: [(restaurant_id, name, km)]}.
+
+    One query over order_distance_idx, closest restaurants first.
+    """
+    distances = defaultdict(list)
+    rows = (
+        OrderRestaurantDistance.objects
+        .filter(order_id__in=order_ids)
+        .order_by('order_id', 'distance_km')
+        .values_list('order_id', 'restaurant_id', 'restaurant__name', 'distance_km')
+    )
+    for order_id, restaurant_id, name, distance_km in rows:
+        distances[order_id].append((restaurant_id, name, distance_km))
+    return distances
@@ -0,0 +1,39 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts PostgreSQL statistics for unfiltered tables.
+
+    An exact COUNT(*) over millions of rows scans the whole table, while
+    pg_class.reltuples is kept close enough by autovacuum. Filtered
+    querysets, small tables and other databases are counted exactly.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is not None and estimate > self.exact_count_limit:
+            return estimate
+        return super().count
+
+    def get_estimate(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where or query.distinct:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if not row or row[0] < 0:
+            return None
+        return int(row[0])
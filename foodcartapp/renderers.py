@@ -0,0 +1,100 @@
+import gzip
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_stdlib(data, indent=None):
+    separators = None if indent else (',', ':')
+    return json.dumps(
+        data,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        indent=indent or None,
+        separators=separators,
+    ).encode()
+
+
+def _orjson_default(value):
+    return DjangoJSONEncoder().default(value)
+
+
+def dumps_orjson(data, indent=None):
+    if orjson is None:
+        return dumps_stdlib(data, indent)
+    option = orjson.OPT_INDENT_2 if indent else 0
+    return orjson.dumps(data, default=_orjson_default, option=option)
+
+
+@lru_cache(maxsize=None)
+def get_dumps():
+    return import_string(settings.API_JSON_ENCODER)
+
+
+def dump_json(data):
+    """Encode data with the configured encoder and indent."""
+    return get_dumps()(data, indent=settings.API_JSON_INDENT)
+
+
+def compress(body):
+    """Return the body in every encoding the API can serve."""
+    encoded = {'identity': body}
+    if settings.API_RESPONSE_COMPRESSION:
+        encoded['gzip'] = gzip.compress(body)
+        if brotli is not None:
+            encoded['br'] = brotli.compress(body)
+    return encoded
+
+
+def choose_encoding(request, encodings):
+    accepted = {
+        encoding.split(';')[0].strip()
+        for encoding in request.headers.get('Accept-Encoding', '').split(',')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in encodings and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def json_response(request, encodings, etag=None, cache_control='no-cache'):
+    """Serve a pre-encoded JSON body in the best encoding the client accepts.
+
+    Each encoding gets its own strong ETag, and a matching If-None-Match
+    is answered with 304.
+    """
+    encoding = choose_encoding(request, encodings)
+    if etag and encoding != 'identity':
+        etag = '{}-{}"'.format(etag[:-1], encoding)
+
+    if etag and etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            encodings[encoding],
+            content_type='application/json',
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    if etag:
+        response['ETag'] = etag
+    if len(encodings) > 1:
+        response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
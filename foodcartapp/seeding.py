@@ -0,0 +1,154 @@
+import random
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+
+from geodata.models import PlaceGeolocation
+
+from .catalogue import bump_catalogue_version, bump_menu_version
+from .geo_index import invalidate_restaurant_geo_index
+from .models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .order_distances import refresh_pending_order_distances
+
+
+CITY_BOX = (37.35, 55.57, 37.85, 55.92)
+ORDER_STATUSES = [Order.NOT_PROCESSED, Order.PROCESSED, Order.FINISHED]
+ORDER_STATUS_WEIGHTS = [3, 1, 6]
+CATEGORIES_COUNT = 12
+SEED_PHONE = '+79291000000'
+
+
+def random_place(rng, address):
+    min_lon, min_lat, max_lon, max_lat = CITY_BOX
+    return PlaceGeolocation(
+        address=address,
+        lon=rng.uniform(min_lon, max_lon),
+        lat=rng.uniform(min_lat, max_lat),
+    )
+
+
+def create_catalogue(rng, products_count, tag):
+    ProductCategory.objects.bulk_create([
+        ProductCategory(name=f'Категория {number} ({tag})')
+        for number in range(CATEGORIES_COUNT)
+    ])
+    categories = list(
+        ProductCategory.objects.filter(name__endswith=f'({tag})')
+    )
+    Product.objects.bulk_create([
+        Product(
+            name=f'Бургер №{number} ({tag})',
+            category=rng.choice(categories) if number % 5 else None,
+            price=Decimal(rng.randrange(9900, 99900)) / 100,
+            image='seed.png',
+            special_status=number % 7 == 0,
+            description='Сочная котлета, свежие овощи и фирменный соус',
+        )
+        for number in range(products_count)
+    ])
+    return list(
+        Product.objects
+        .filter(name__endswith=f'({tag})')
+        .values_list('id', 'price')
+    )
+
+
+def create_restaurants(rng, restaurants_count, products, menu_share, tag):
+    restaurants = [
+        Restaurant(
+            name=f'Ресторан №{number} ({tag})',
+            address=f'Москва, Нагрузочная ул., {number} ({tag})',
+        )
+        for number in range(restaurants_count)
+    ]
+    PlaceGeolocation.objects.bulk_create(
+        [random_place(rng, restaurant.address) for restaurant in restaurants],
+        ignore_conflicts=True,
+    )
+    Restaurant.objects.bulk_create(restaurants)
+    restaurant_ids = Restaurant.objects.filter(
+        name__endswith=f'({tag})'
+    ).values_list('id', flat=True)
+
+    menu_size = max(1, round(len(products) * menu_share))
+    RestaurantMenuItem.objects.bulk_create(
+        [
+            RestaurantMenuItem(
+                restaurant_id=restaurant_id,
+                product_id=product_id,
+                availability=rng.random() < 0.9,
+            )
+            for restaurant_id in restaurant_ids
+            for product_id, _ in rng.sample(products, min(menu_size, len(products)))
+        ],
+        batch_size=5000,
+    )
+
+
+def create_orders(rng, orders_count, products, tag):
+    orders = [
+        Order(
+            firstname='Нагрузка',
+            lastname=tag,
+            phonenumber=SEED_PHONE,
+            address=f'Москва, Заказная ул., {number} ({tag})',
+            status=rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            payment_type=rng.choice([Order.ELECTRON, Order.CASH]),
+        )
+        for number in range(orders_count)
+    ]
+    PlaceGeolocation.objects.bulk_create(
+        [random_place(rng, order.address) for order in orders],
+        ignore_conflicts=True,
+        batch_size=5000,
+    )
+    Order.objects.bulk_create(orders, batch_size=5000)
+    order_ids = Order.objects.filter(lastname=tag).values_list('id', flat=True)
+
+    items = []
+    for order_id in order_ids:
+        for product_id, price in rng.sample(products, min(3, len(products))):
+            quantity = rng.randint(1, 3)
+            items.append(OrderItem(
+                order_id=order_id,
+                product_id=product_id,
+                quantity=quantity,
+                price=price * quantity,
+            ))
+    OrderItem.objects.bulk_create(items, batch_size=5000)
+    Order.objects.filter(lastname=tag).update_total_prices()
+
+
+def seed_load(restaurants_count, products_count, orders_count,
+              menu_share=0.5, seed=None):
+    """Fill the database with a synthetic catalogue, menus and orders.
+
+    Every address gets a PlaceGeolocation row, so nothing is sent to the
+    geocoder afterwards. Bulk inserts skip model signals, so the caches
+    they would have invalidated are bumped at the end. Rows are tagged
+    with a random token, which lets the command run several times over
+    the same database. Returns the tag.
+    """
+    rng = random.Random(seed)
+    tag = uuid.uuid4().hex[:8]
+    with transaction.atomic():
+        products = create_catalogue(rng, products_count, tag)
+        create_restaurants(rng, restaurants_count, products, menu_share, tag)
+        Product.objects.filter(
+            name__endswith=f'({tag})'
+        ).refresh_availability()
+        create_orders(rng, orders_count, products, tag)
+
+    bump_catalogue_version()
+    bump_menu_version()
+    invalidate_restaurant_geo_index()
+    refresh_pending_order_distances(Order.objects.filter(lastname=tag))
+    return tag
@@ -0,0 +1,113 @@
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+
+from geodata.geocoder import enqueue_addresses
+
+from .catalogue import (
+    bump_catalogue_version,
+    bump_menu_version,
+    bump_restaurant_menu_version,
+)
+from .models import Order, OrderItem, Product, RestaurantMenuItem
+from .order_distances import refresh_distances_on_commit
+
+
+def build_order_items(ordered_products):
+    return [
+        OrderItem(
+            product=product['obj'],
+            quantity=product['quantity'],
+            price=product['obj'].price * product['quantity']
+        )
+        for product in ordered_products
+    ]
+
+
+def build_order(order_data):
+    """Return an unsaved order and its items from validated data."""
+    items = build_order_items(order_data['products'])
+    order = Order(
+        firstname=order_data['firstname'],
+        lastname=order_data['lastname'],
+        phonenumber=order_data['phonenumber'],
+        address=order_data['address'],
+        total_price=sum(item.price for item in items),
+    )
+    return order, items
+
+
+def create_orders(orders_data):
+    """Save orders with their items in a single transaction.
+
+    Orders and items are inserted with one bulk query each where the
+    database returns primary keys from bulk inserts, and the delivery
+    addresses are queued for geocoding in the same commit.
+    """
+    built_orders = [build_order(order_data) for order_data in orders_data]
+    orders = [order for order, _ in built_orders]
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders)
+        else:
+            for order in orders:
+                # The addresses are queued in bulk below.
+                order._address_queued = True
+                order.save()
+
+        order_items = []
+        for order, items in built_orders:
+            for item in items:
+                item.order = order
+            order_items.extend(items)
+        OrderItem.objects.bulk_create(order_items)
+
+        enqueue_addresses(order.address for order in orders)
+
+    return orders
+
+
+def create_order(order_data):
+    order, = create_orders([order_data])
+    return order
+
+
+def update_menu_availability(menu_items, availability):
+    """Set availability for a queryset of menu items with one UPDATE.
+
+    The update bypasses model signals, so the products' is_available
+    flags, the catalogue caches and the distances of pending orders with
+    these products are refreshed here, once for the whole batch.
+    """
+    with transaction.atomic():
+        affected = list(menu_items.values_list('product_id', 'restaurant_id'))
+        product_ids = {product_id for product_id, _ in affected}
+        restaurant_ids = {restaurant_id for _, restaurant_id in affected}
+        updated = menu_items.update(availability=availability)
+        Product.objects.filter(pk__in=product_ids).refresh_availability()
+        bump_catalogue_version()
+        bump_menu_version()
+        for restaurant_id in restaurant_ids:
+            bump_restaurant_menu_version(restaurant_id)
+        refresh_distances_on_commit(product_ids)
+    return updated
+
+
+def set_restaurant_menu_availability(restaurant_id, changes):
+    """Apply {product_id: availability} to a restaurant's menu at once."""
+    available_ids = [
+        product_id
+        for product_id, availability in changes.items()
+        if availability
+    ]
+    menu_items = RestaurantMenuItem.objects.filter(
+        restaurant_id=restaurant_id,
+        product_id__in=changes.keys(),
+    )
+    return update_menu_availability(
+        menu_items,
+        Case(
+            When(product_id__in=available_ids, then=Value(True)),
+            default=Value(False),
+        )
+    )
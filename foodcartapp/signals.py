@@ -0,0 +1,289 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .catalogue import (
+    bump_banners_version,
+    bump_catalogue_version,
+    bump_menu_version,
+    bump_products_version,
+    bump_restaurant_menu_version,
+)
+from .geo_index import invalidate_restaurant_geo_index
+from .models import (
+    Banner,
+    Order,
+    OrderRestaurantDistance,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .order_distances import (
+    refresh_distances_on_commit,
+    refresh_pending_order_distances,
+)
+from geodata.geocoder import enqueue_addresses
+from geodata.models import PlaceGeolocation
+from geodata.signals import addresses_geocoded, places_updated
+
+
+def refresh_product_availability(instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).refresh_availability()
+
+
+def bump_restaurant_menu_on_item_change(instance, **kwargs):
+    bump_restaurant_menu_version(instance.restaurant_id)
+
+
+def bump_restaurant_menu_on_restaurant_change(instance, **kwargs):
+    bump_restaurant_menu_version(instance.pk)
+
+
+def invalidate_geo_index_for_places(addresses):
+    if Restaurant.objects.filter(address__in=addresses).exists():
+        invalidate_restaurant_geo_index()
+
+
+def on_place_changed(instance, **kwargs):
+    invalidate_geo_index_for_places([instance.address])
+
+
+def on_places_updated(addresses, **kwargs):
+    invalidate_geo_index_for_places(addresses)
+
+
+def refresh_distances_on_geocoded(addresses, **kwargs):
+    # A restaurant located at last can be the nearest one for any order.
+    if Restaurant.objects.filter(address__in=addresses).exists():
+        refresh_pending_order_distances()
+        return
+    refresh_pending_order_distances(
+        Order.objects.filter(address__in=addresses)
+    )
+
+
+def remember_order_address(instance, update_fields=None, **kwargs):
+    instance._previous_address = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'address' not in update_fields:
+        instance._previous_address = instance.address
+        return
+    instance._previous_address = (
+        Order.objects
+        .filter(pk=instance.pk)
+        .values_list('address', flat=True)
+        .first()
+    )
+    if instance.address != instance._previous_address:
+        instance.distances_status = Order.DISTANCES_NOT_CALCULATED
+
+
+def geocode_order_address(instance, created, **kwargs):
+    """Queue new and corrected addresses, dropping outdated distances.
+
+    Orders from the API are queued in bulk by create_orders; this covers
+    the ones created or edited one by one, e.g. in the admin.
+    """
+    if created and getattr(instance, '_address_queued', False):
+        return
+    if not created and instance.address == instance._previous_address:
+        return
+    if not created:
+        OrderRestaurantDistance.objects.filter(order=instance).delete()
+    enqueue_addresses([instance.address])
+
+
+def stamp_order_finished_at(instance, **kwargs):
+    if instance.status != Order.FINISHED:
+        instance.finished_at = None
+    elif instance.finished_at is None:
+        instance.finished_at = timezone.now()
+
+
+def remember_restaurant_address(instance, **kwargs):
+    instance._previous_address = (
+        Restaurant.objects
+        .filter(pk=instance.pk)
+        .values_list('address', flat=True)
+        .first()
+    )
+
+
+def is_restaurant_moved(instance, created):
+    return not created and instance.address != instance._previous_address
+
+
+def invalidate_geo_index_on_restaurant_save(instance, created, **kwargs):
+    if created or is_restaurant_moved(instance, created):
+        invalidate_restaurant_geo_index()
+
+
+def geocode_restaurant_address(instance, created, **kwargs):
+    """Queue new and moved restaurants right away.
+
+    With DELIVERY_RADIUS_KM set distances are built from load_nearby,
+    which reads stored places only, so nothing else would queue them.
+    """
+    if instance.address and (
+        created or is_restaurant_moved(instance, created)
+    ):
+        enqueue_addresses([instance.address])
+
+
+def refresh_distances_on_restaurant_moved(instance, created, **kwargs):
+    if is_restaurant_moved(instance, created):
+        refresh_distances_on_commit()
+
+
+def refresh_distances_on_menu_change(instance, **kwargs):
+    refresh_distances_on_commit([instance.product_id])
+
+
+def connect_signals():
+    for model in (Product, ProductCategory, RestaurantMenuItem):
+        post_save.connect(
+            bump_catalogue_version,
+            sender=model,
+            dispatch_uid=f'bump_catalogue_on_save_{model.__name__}',
+        )
+        post_delete.connect(
+            bump_catalogue_version,
+            sender=model,
+            dispatch_uid=f'bump_catalogue_on_delete_{model.__name__}',
+        )
+
+    for model in (Product, ProductCategory):
+        post_save.connect(
+            bump_products_version,
+            sender=model,
+            dispatch_uid=f'bump_products_on_save_{model.__name__}',
+        )
+        post_delete.connect(
+            bump_products_version,
+            sender=model,
+            dispatch_uid=f'bump_products_on_delete_{model.__name__}',
+        )
+    post_save.connect(
+        bump_restaurant_menu_on_item_change,
+        sender=RestaurantMenuItem,
+        dispatch_uid='bump_restaurant_menu_on_item_save',
+    )
+    post_delete.connect(
+        bump_restaurant_menu_on_item_change,
+        sender=RestaurantMenuItem,
+        dispatch_uid='bump_restaurant_menu_on_item_delete',
+    )
+    post_save.connect(
+        bump_restaurant_menu_on_restaurant_change,
+        sender=Restaurant,
+        dispatch_uid='bump_restaurant_menu_on_restaurant_save',
+    )
+    post_delete.connect(
+        bump_restaurant_menu_on_restaurant_change,
+        sender=Restaurant,
+        dispatch_uid='bump_restaurant_menu_on_restaurant_delete',
+    )
+
+    post_save.connect(
+        bump_banners_version,
+        sender=Banner,
+        dispatch_uid='bump_banners_on_save',
+    )
+    post_delete.connect(
+        bump_banners_version,
+        sender=Banner,
+        dispatch_uid='bump_banners_on_delete',
+    )
+
+    post_save.connect(
+        bump_menu_version,
+        sender=RestaurantMenuItem,
+        dispatch_uid='bump_menu_on_save',
+    )
+    post_delete.connect(
+        bump_menu_version,
+        sender=RestaurantMenuItem,
+        dispatch_uid='bump_menu_on_delete',
+    )
+
+    post_save.connect(
+        refresh_product_availability,
+        sender=RestaurantMenuItem,
+        dispatch_uid='refresh_product_availability_on_save',
+    )
+    post_delete.connect(
+        refresh_product_availability,
+        sender=RestaurantMenuItem,
+        dispatch_uid='refresh_product_availability_on_delete',
+    )
+
+    post_save.connect(
+        invalidate_geo_index_on_restaurant_save,
+        sender=Restaurant,
+        dispatch_uid='invalidate_geo_index_on_restaurant_save',
+    )
+    post_delete.connect(
+        invalidate_restaurant_geo_index,
+        sender=Restaurant,
+        dispatch_uid='invalidate_geo_index_on_restaurant_delete',
+    )
+    post_save.connect(
+        on_place_changed,
+        sender=PlaceGeolocation,
+        dispatch_uid='invalidate_geo_index_on_place_save',
+    )
+    post_delete.connect(
+        on_place_changed,
+        sender=PlaceGeolocation,
+        dispatch_uid='invalidate_geo_index_on_place_delete',
+    )
+    places_updated.connect(
+        on_places_updated,
+        dispatch_uid='invalidate_geo_index_on_places_updated',
+    )
+
+    addresses_geocoded.connect(
+        refresh_distances_on_geocoded,
+        dispatch_uid='refresh_distances_on_geocoded',
+    )
+    pre_save.connect(
+        stamp_order_finished_at,
+        sender=Order,
+        dispatch_uid='stamp_order_finished_at',
+    )
+    pre_save.connect(
+        remember_order_address,
+        sender=Order,
+        dispatch_uid='remember_order_address',
+    )
+    post_save.connect(
+        geocode_order_address,
+        sender=Order,
+        dispatch_uid='geocode_order_address',
+    )
+    pre_save.connect(
+        remember_restaurant_address,
+        sender=Restaurant,
+        dispatch_uid='remember_restaurant_address',
+    )
+    post_save.connect(
+        geocode_restaurant_address,
+        sender=Restaurant,
+        dispatch_uid='geocode_restaurant_address',
+    )
+    post_save.connect(
+        refresh_distances_on_restaurant_moved,
+        sender=Restaurant,
+        dispatch_uid='refresh_distances_on_restaurant_save',
+    )
+    post_save.connect(
+        refresh_distances_on_menu_change,
+        sender=RestaurantMenuItem,
+        dispatch_uid='refresh_distances_on_menu_save',
+    )
+    post_delete.connect(
+        refresh_distances_on_menu_change,
+        sender=RestaurantMenuItem,
+        dispatch_uid='refresh_distances_on_menu_delete',
+    )
@@ -0,0 +1,667 @@
+import pickle
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from geodata.distances import haversine_matrix
+from geodata.geocoder import process_tasks
+from geodata.models import GeocodingTask, PlaceGeolocation
+from geodata.tests import StubSession
+from star_burger.nplusone import assert_no_n_plus_one
+
+from .assignment import plan_assignments
+from .availability import MenuMatrix, RestaurantAvailability
+from .catalogue import get_cache_version, get_cached_payload
+from .geo_index import RestaurantGeoIndex
+from .management.commands.bench_views import get_endpoints
+from .models import (
+    Order,
+    OrderItem,
+    OrderRestaurantDistance,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .order_distances import refresh_order_distances
+from .seeding import seed_load
+from .views import OrderSerializer
+
+
+def make_order(product_ids):
+    return {
+        'products': [
+            {'product': product_id, 'quantity': 1}
+            for product_id in product_ids
+        ],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79291000000',
+        'address': 'Москва, Красная площадь, 1',
+    }
+
+
+class OrderProductsValidationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f'Бургер №{number}', price=100, image='burger.png')
+            for number in range(10)
+        ])
+        cls.product_ids = list(Product.objects.values_list('id', flat=True))
+
+    def test_one_query_for_any_number_of_products(self):
+        for product_ids in [self.product_ids[:1], self.product_ids]:
+            with self.subTest(products=len(product_ids)):
+                serializer = OrderSerializer(data=make_order(product_ids))
+                with self.assertNumQueries(1):
+                    self.assertTrue(serializer.is_valid())
+
+    def test_register_order_queries_do_not_grow_with_products(self):
+        query_counts = []
+        for product_ids in [self.product_ids[:1], self.product_ids]:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    '/api/order/',
+                    make_order(product_ids),
+                    content_type='application/json',
+                )
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(context))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_unknown_products_are_reported_together(self):
+        serializer = OrderSerializer(data=make_order([0, -1]))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('-1, 0', str(serializer.errors['products']))
+
+
+class OrderQuantityValidationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Бургер', price=100, image='burger.png'
+        )
+
+    def make_order(self, quantity):
+        order = make_order([self.product.id])
+        order['products'][0]['quantity'] = quantity
+        return order
+
+    def test_bad_quantities_are_rejected(self):
+        for quantity in ['abc', -3, 0, None]:
+            with self.subTest(quantity=quantity):
+                response = self.client.post(
+                    '/api/order/',
+                    self.make_order(quantity),
+                    content_type='application/json',
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('products', response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_one_bad_line_rejects_the_batch(self):
+        partner = get_user_model().objects.create_superuser('partner')
+        self.client.force_login(partner)
+        response = self.client.post(
+            '/api/orders/batch/',
+            [self.make_order(2), self.make_order('abc')],
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+class OrdersBatchAccessTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(
+            name='Бургер', price=100, image='burger.png'
+        )
+        cls.orders = [make_order([product.id])]
+        cls.partner = get_user_model().objects.create_user('partner')
+        cls.partner.user_permissions.add(
+            Permission.objects.get(codename='add_order')
+        )
+
+    def post_batch(self):
+        return self.client.post(
+            '/api/orders/batch/',
+            self.orders,
+            content_type='application/json',
+        )
+
+    def test_anonymous_is_rejected(self):
+        self.assertEqual(self.post_batch().status_code, 401)
+
+    def test_user_without_permission_is_rejected(self):
+        self.client.force_login(
+            get_user_model().objects.create_user('customer')
+        )
+        self.assertEqual(self.post_batch().status_code, 403)
+
+    def test_partner_registers_orders(self):
+        self.client.force_login(self.partner)
+        response = self.post_batch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class CatalogueVersionTest(TestCase):
+    def test_version_is_bumped_after_commit(self):
+        version = get_cache_version('catalogue')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Бургер', price=100, image='burger.png')
+            self.assertEqual(get_cache_version('catalogue'), version)
+        self.assertNotEqual(get_cache_version('catalogue'), version)
+
+
+class CachedPayloadTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_payload_is_built_once(self):
+        dump = mock.Mock(return_value=[{'id': 1}])
+        payload = get_cached_payload('test:payload', dump)
+        self.assertEqual(get_cached_payload('test:payload', dump), payload)
+        dump.assert_called_once_with()
+        self.assertTrue(payload[1].startswith('"'))
+
+    def test_missing_data_is_not_cached(self):
+        self.assertIsNone(get_cached_payload('test:missing', lambda: None))
+        self.assertIsNotNone(get_cached_payload('test:missing', lambda: []))
+
+
+class RestaurantGeoIndexLoadTest(TestCase):
+    def test_unknown_addresses_are_queued_not_fetched(self):
+        located = Restaurant.objects.create(name='Центр', address='Тверская, 1')
+        Restaurant.objects.create(name='Окраина', address='Новая, 1')
+        Restaurant.objects.create(name='Нигде', address='Несуществующая, 1')
+        PlaceGeolocation.objects.create(address='Тверская, 1', lon=37.6, lat=55.7)
+        PlaceGeolocation.objects.create(address='Несуществующая, 1')
+        GeocodingTask.objects.all().delete()
+
+        with self.assertLogs('foodcartapp.geo_index', 'WARNING'):
+            index = RestaurantGeoIndex.load()
+
+        self.assertEqual(list(index.restaurant_ids), [located.id])
+        self.assertQuerysetEqual(
+            GeocodingTask.objects.values_list('address', flat=True),
+            ['Новая, 1'],
+        )
+
+    def test_expired_places_are_queued_again(self):
+        stale = Restaurant.objects.create(name='Центр', address='Тверская, 1')
+        Restaurant.objects.create(name='Нигде', address='Несуществующая, 1')
+        PlaceGeolocation.objects.create(address='Тверская, 1', lon=37.6, lat=55.7)
+        PlaceGeolocation.objects.create(address='Несуществующая, 1')
+        PlaceGeolocation.objects.update(
+            last_update=timezone.now() - timedelta(days=365)
+        )
+        GeocodingTask.objects.all().delete()
+
+        with self.assertLogs('foodcartapp.geo_index', 'WARNING'):
+            index = RestaurantGeoIndex.load()
+
+        self.assertEqual(list(index.restaurant_ids), [stale.id])
+        self.assertQuerysetEqual(
+            GeocodingTask.objects.values_list('address', flat=True),
+            ['Несуществующая, 1', 'Тверская, 1'],
+            ordered=False,
+        )
+
+
+class RestaurantGeoIndexNearestTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.coordinates = np.column_stack([
+            rng.uniform(37.3, 37.9, 300),
+            rng.uniform(55.5, 56.0, 300),
+        ])
+        self.restaurant_ids = list(range(1000, 1300))
+        self.index = RestaurantGeoIndex(
+            self.restaurant_ids, self.coordinates, cell_size=0.02
+        )
+        self.origins = np.column_stack([
+            rng.uniform(37.2, 38.0, 40),
+            rng.uniform(55.4, 56.1, 40),
+        ])
+
+    def brute_force(self, lon, lat, k, restaurant_ids=None):
+        distances = haversine_matrix([(lon, lat)], self.coordinates)[0]
+        candidates = [
+            (restaurant_id, distance_km)
+            for restaurant_id, distance_km in zip(self.restaurant_ids, distances)
+            if restaurant_ids is None or restaurant_id in restaurant_ids
+        ]
+        return sorted(candidates, key=lambda candidate: candidate[1])[:k]
+
+    def assert_same_neighbours(self, found, expected):
+        self.assertEqual(
+            [restaurant_id for restaurant_id, _ in found],
+            [restaurant_id for restaurant_id, _ in expected],
+        )
+        np.testing.assert_allclose(
+            [km for _, km in found],
+            [km for _, km in expected],
+        )
+
+    def test_matches_brute_force(self):
+        for lon, lat in self.origins:
+            for k in [1, 5, 20]:
+                with self.subTest(lon=lon, lat=lat, k=k):
+                    self.assert_same_neighbours(
+                        self.index.nearest(lon, lat, k),
+                        self.brute_force(lon, lat, k),
+                    )
+
+    def test_matches_brute_force_within_allowed_restaurants(self):
+        allowed = set(self.restaurant_ids[::7])
+        for lon, lat in self.origins:
+            with self.subTest(lon=lon, lat=lat):
+                self.assert_same_neighbours(
+                    self.index.nearest(lon, lat, 5, restaurant_ids=allowed),
+                    self.brute_force(lon, lat, 5, allowed),
+                )
+
+    def test_far_away_origin(self):
+        self.assert_same_neighbours(
+            self.index.nearest(49.12, 55.79, 3),
+            self.brute_force(49.12, 55.79, 3),
+        )
+
+    def test_edge_cases(self):
+        self.assertEqual(self.index.nearest(37.6, 55.7, k=0), [])
+        self.assertEqual(self.index.nearest(37.6, 55.7, restaurant_ids=[]), [])
+        self.assertEqual(RestaurantGeoIndex([], []).nearest(37.6, 55.7), [])
+        self.assertEqual(len(self.index.nearest(37.6, 55.7, k=500)), 300)
+
+
+class OrderDistancesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(
+            name='Бургер', price=100, image='burger.png'
+        )
+        cls.salad = Product.objects.create(
+            name='Салат', price=100, image='salad.png'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Центр', address='Тверская, 1'
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.restaurant, product=cls.burger
+        )
+        PlaceGeolocation.objects.bulk_create([
+            PlaceGeolocation(address='Тверская, 1', lon=37.61, lat=55.76),
+            PlaceGeolocation(address='Арбат, 1', lon=37.59, lat=55.75),
+            PlaceGeolocation(address='Несуществующая, 1'),
+        ])
+
+    def setUp(self):
+        # The restaurant index is process-wide and keyed by a cached version.
+        cache.clear()
+
+    def create_order(self, address, product):
+        order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79291000000',
+            address=address,
+        )
+        OrderItem.objects.create(
+            order=order, product=product, quantity=1, price=100
+        )
+        return order
+
+    def test_every_order_gets_a_status(self):
+        orders = {
+            Order.DISTANCES_CALCULATED: self.create_order('Арбат, 1', self.burger),
+            Order.NO_CAPABLE_RESTAURANTS: self.create_order('Арбат, 1', self.salad),
+            Order.ADDRESS_NOT_FOUND: self.create_order(
+                'Несуществующая, 1', self.burger
+            ),
+            Order.DISTANCES_NOT_CALCULATED: self.create_order(
+                'Новая, 1', self.burger
+            ),
+        }
+
+        rows = refresh_order_distances(Order.objects.all())
+
+        self.assertEqual(
+            [row.order_id for row in rows],
+            [orders[Order.DISTANCES_CALCULATED].id],
+        )
+        for status, order in orders.items():
+            order.refresh_from_db()
+            self.assertEqual(order.distances_status, status)
+
+    def test_menu_changes_refresh_once_per_transaction(self):
+        self.create_order('Арбат, 1', self.salad)
+        other = Restaurant.objects.create(name='Арбат', address='Арбат, 1')
+        with mock.patch(
+            'foodcartapp.order_distances.refresh_pending_order_distances'
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for product in (self.burger, self.salad):
+                        RestaurantMenuItem.objects.create(
+                            restaurant=other, product=product
+                        )
+                refresh.assert_not_called()
+        refresh.assert_called_once()
+
+    def test_restaurant_refreshes_only_when_moved(self):
+        with mock.patch(
+            'foodcartapp.order_distances.refresh_pending_order_distances'
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.restaurant.name = 'Центральный'
+                self.restaurant.save()
+            refresh.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.restaurant.address = 'Арбат, 1'
+                self.restaurant.save()
+            refresh.assert_called_once_with()
+
+
+class ViewsQueryCountTest(TestCase):
+    """The same checks as bench_views, on data small enough for tests."""
+
+    def request(self, method, url, body):
+        kwargs = {'content_type': 'application/json'} if body else {}
+        response = getattr(self.client, method)(url, body, **kwargs)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(
+            get_user_model().objects.create_superuser('manager')
+        )
+
+    def count_queries(self):
+        query_counts = {}
+        for name, method, url, body in get_endpoints():
+            self.request(method, url, body)
+            with CaptureQueriesContext(connection) as context:
+                self.request(method, url, body)
+            query_counts[name] = len(context)
+        return query_counts
+
+    def test_queries_do_not_grow_with_data(self):
+        seed_load(3, 10, 20, seed=0)
+        small = self.count_queries()
+        seed_load(6, 20, 60, seed=1)
+        self.assertEqual(self.count_queries(), small)
+
+    def test_no_n_plus_one(self):
+        seed_load(3, 10, 20, seed=0)
+        for name, method, url, body in get_endpoints():
+            with self.subTest(name), assert_no_n_plus_one():
+                self.request(method, url, body)
+
+
+class OrderAdminSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79291000000',
+            address='Москва, Арбат, 1',
+        )
+        Order.objects.create(
+            firstname='Пётр',
+            lastname='Иванов',
+            phonenumber='+79291000001',
+            address='Москва, Тверская, 1',
+        )
+        cls.admin = get_user_model().objects.create_superuser('admin')
+
+    def search(self, term):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/foodcartapp/order/', {'q': term})
+        return list(response.context['cl'].result_list)
+
+    def test_search(self):
+        for term in [
+            str(self.order.id),
+            '+7 929 100-00-00',
+            'Петров',
+            'Москва, Арбат',
+        ]:
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), [self.order])
+
+
+class RestaurantAvailabilityTest(SimpleTestCase):
+    def setUp(self):
+        self.availability = RestaurantAvailability([
+            (1, 10),
+            (1, 20),
+            (2, 20),
+            (2, 30),
+            (3, 30),
+        ])
+
+    def test_restaurants_having_every_product(self):
+        self.assertEqual(self.availability.get_restaurant_ids([1]), [10, 20])
+        self.assertEqual(self.availability.get_restaurant_ids([1, 2]), [20])
+        self.assertEqual(self.availability.get_restaurant_ids([2, 3]), [30])
+
+    def test_no_restaurant_has_everything(self):
+        self.assertEqual(self.availability.get_restaurant_ids([1, 3]), [])
+
+    def test_unknown_and_empty_products(self):
+        self.assertEqual(self.availability.get_restaurant_ids([1, 99]), [])
+        self.assertEqual(self.availability.get_restaurant_ids([]), [])
+
+    def test_many_restaurants(self):
+        menu_items = [(1, restaurant_id) for restaurant_id in range(200)]
+        menu_items.append((2, 150))
+        availability = RestaurantAvailability(menu_items)
+        self.assertEqual(availability.get_restaurant_ids([1]), list(range(200)))
+        self.assertEqual(availability.get_restaurant_ids([1, 2]), [150])
+
+
+class MenuMatrixTest(SimpleTestCase):
+    def setUp(self):
+        self.matrix = MenuMatrix([
+            (1, 10, True),
+            (1, 20, False),
+            (2, 20, True),
+            (3, 30, True),
+        ])
+
+    def test_grid_follows_the_requested_order(self):
+        np.testing.assert_array_equal(
+            self.matrix.get_grid([2, 1], [30, 20, 10]),
+            [
+                [False, True, False],
+                [False, False, True],
+            ],
+        )
+
+    def test_unknown_ids_are_unavailable(self):
+        np.testing.assert_array_equal(
+            self.matrix.get_grid([1, 99], [10, 99]),
+            [
+                [True, False],
+                [False, False],
+            ],
+        )
+
+    def test_empty_menu(self):
+        grid = MenuMatrix([]).get_grid([1, 2], [10])
+        self.assertEqual(grid.shape, (2, 1))
+        self.assertFalse(grid.any())
+
+    def test_pickled_grid_is_packed(self):
+        rng = np.random.default_rng(0)
+        menu_items = [
+            (product_id, restaurant_id, bool(available))
+            for product_id in range(300)
+            for restaurant_id, available in enumerate(rng.random(300) < 0.5)
+        ]
+        matrix = MenuMatrix(menu_items)
+        restored = pickle.loads(pickle.dumps(matrix))
+        np.testing.assert_array_equal(restored.grid, matrix.grid)
+        self.assertLess(len(pickle.dumps(matrix)), matrix.grid.nbytes / 4)
+
+
+class PlanAssignmentsTest(SimpleTestCase):
+    def test_nearest_restaurant_wins(self):
+        distances = np.array([
+            [1.0, 2.0],
+            [3.0, 0.5],
+        ])
+        self.assertEqual(
+            sorted(plan_assignments(distances, [0, 0], cap=5)),
+            [(0, 0), (1, 1)],
+        )
+
+    def test_cap_sends_orders_to_the_next_restaurant(self):
+        distances = np.array([
+            [1.0, 4.0],
+            [2.0, 5.0],
+            [3.0, 6.0],
+        ])
+        self.assertEqual(
+            plan_assignments(distances, [0, 0], cap=2),
+            [(0, 0), (1, 0), (2, 1)],
+        )
+
+    def test_existing_loads_count_towards_the_cap(self):
+        distances = np.array([
+            [1.0, 4.0],
+            [2.0, 5.0],
+        ])
+        self.assertEqual(
+            plan_assignments(distances, [1, 2], cap=2),
+            [(0, 0)],
+        )
+
+    def test_infinite_distances_are_never_assigned(self):
+        distances = np.array([
+            [np.inf, 2.0],
+            [np.inf, np.inf],
+        ])
+        self.assertEqual(plan_assignments(distances, [0, 0], cap=1), [(0, 1)])
+
+
+class OrderDistancesLifecycleTest(TransactionTestCase):
+    """Distances follow orders and restaurants through geocode_worker.
+
+    Cache versions are bumped on commit, so these tests commit for real.
+    """
+
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(
+            name='Бургер', price=100, image='burger.png'
+        )
+        self.restaurant = Restaurant.objects.create(
+            name='Центр', address='Тверская, 1'
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=self.restaurant, product=product
+        )
+        PlaceGeolocation.objects.bulk_create([
+            PlaceGeolocation(address='Тверская, 1', lon=37.61, lat=55.76),
+            PlaceGeolocation(address='Арбат, 1', lon=37.59, lat=55.75),
+        ])
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79291000000',
+            address='Арбат, 1',
+        )
+        OrderItem.objects.create(
+            order=self.order, product=product, quantity=1, price=100
+        )
+        self.session = StubSession({
+            'Арбат, 1': (37.59, 55.75),
+            'Кутузовский, 1': (37.56, 55.74),
+            'Покровка, 1': (37.64, 55.76),
+        })
+        self.process_tasks()
+
+    def process_tasks(self):
+        with mock.patch('geodata.geocoder.get_session', return_value=self.session):
+            while process_tasks():
+                pass
+
+    def assert_distances(self, status, rows_count):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.distances_status, status)
+        self.assertEqual(
+            OrderRestaurantDistance.objects.filter(order=self.order).count(),
+            rows_count,
+        )
+
+    def test_new_order_is_geocoded_and_ranked(self):
+        self.assert_distances(Order.DISTANCES_CALCULATED, 1)
+
+    def move_restaurant(self, address):
+        self.restaurant.address = address
+        if settings.DELIVERY_RADIUS_KM:
+            self.restaurant.save()
+            return
+        with self.assertLogs('foodcartapp.geo_index', 'WARNING'):
+            self.restaurant.save()
+
+    @override_settings(DELIVERY_RADIUS_KM=0)
+    def test_moved_restaurant_comes_back_once_geocoded(self):
+        self.move_restaurant('Кутузовский, 1')
+        self.process_tasks()
+
+        self.assert_distances(Order.DISTANCES_CALCULATED, 1)
+        distance_km = OrderRestaurantDistance.objects.get().distance_km
+        self.assertAlmostEqual(
+            distance_km,
+            haversine_matrix([(37.59, 55.75)], [(37.56, 55.74)])[0, 0],
+        )
+
+    @override_settings(DELIVERY_RADIUS_KM=20)
+    def test_moved_restaurant_comes_back_within_delivery_radius(self):
+        self.move_restaurant('Кутузовский, 1')
+        self.assertTrue(
+            GeocodingTask.objects.filter(address='Кутузовский, 1').exists()
+        )
+
+        self.process_tasks()
+
+        self.assert_distances(Order.DISTANCES_CALCULATED, 1)
+
+    def test_corrected_address_is_geocoded_again(self):
+        self.order.address = 'Покровка, 1'
+        self.order.save()
+        self.assert_distances(Order.DISTANCES_NOT_CALCULATED, 0)
+        self.assertTrue(
+            GeocodingTask.objects.filter(address='Покровка, 1').exists()
+        )
+
+        self.process_tasks()
+
+        self.assert_distances(Order.DISTANCES_CALCULATED, 1)
+
+    def test_refresh_is_visible_to_the_changes_poll(self):
+        since = timezone.now()
+        refresh_order_distances(Order.objects.all())
+        self.order.refresh_from_db()
+        self.assertGreaterEqual(self.order.updated_at, since)
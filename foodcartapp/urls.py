@@ -1,6 +1,13 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    product_list_api,
+    banners_list_api,
+    register_order,
+    register_orders_batch,
+    restaurant_menu_api,
+    menu_availability_api
+)
 
 
 app_name = "foodcartapp"
@@ -9,4 +16,10 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('orders/batch/', register_orders_batch),
+    path('restaurants/<int:restaurant_id>/menu/', restaurant_menu_api),
+    path(
+        'restaurants/<int:restaurant_id>/menu/availability/',
+        menu_availability_api
+    ),
 ]
@@ -1,32 +1,77 @@
-import logging
-
 from phonenumbers import is_valid_number
 from phonenumbers.phonenumberutil import NumberParseException
 from phonenumber_field.phonenumber import PhoneNumber
 
-from django.http import JsonResponse
-from django.templatetags.static import static
-from django.core.exceptions import ObjectDoesNotExist
-from rest_framework.decorators import api_view
+from rest_framework.authentication import (
+    BasicAuthentication,
+    SessionAuthentication,
+)
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+    throttle_classes,
+)
+from rest_framework.permissions import BasePermission, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.throttling import UserRateThrottle
 from rest_framework.serializers import (
     ValidationError,
+    Serializer,
     ModelSerializer,
-    ListField
+    BooleanField,
+    IntegerField,
+    ListSerializer
 )
-from django.db import transaction
 from django.conf import settings
+from django.http import Http404
+
+from .catalogue import (
+    get_banners_payload,
+    get_products_payload,
+    get_restaurant_menu_payload,
+)
+from .models import Product, Order
+from .renderers import json_response
+from .services import (
+    create_order,
+    create_orders,
+    set_restaurant_menu_availability
+)
+
+
+class OrderListSerializer(ListSerializer):
+    def to_internal_value(self, data):
+        product_ids = set()
+        for order in data if isinstance(data, list) else []:
+            products = order.get('products') if isinstance(order, dict) else None
+            for product in products if isinstance(products, list) else []:
+                try:
+                    product_ids.add(int(product['product']))
+                except (TypeError, KeyError, ValueError):
+                    continue
+        self.context['products'] = Product.objects.in_bulk(product_ids)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        return create_orders(validated_data)
 
-from .models import Product, Order, OrderItem
-from geodata.models import PlaceGeolocation
-from geodata.views import fetch_coordinates
+
+class OrderItemSerializer(Serializer):
+    product = IntegerField()
+    quantity = IntegerField(min_value=1)
 
 
 class OrderSerializer(ModelSerializer):
-    products = ListField(allow_empty=False, write_only=True)
+    products = OrderItemSerializer(
+        many=True,
+        allow_empty=False,
+        write_only=True
+    )
 
     class Meta:
         model = Order
+        list_serializer_class = OrderListSerializer
         fields = [
             'id',
             'firstname',
@@ -56,109 +101,99 @@ class OrderSerializer(ModelSerializer):
         return phone_num
 
     def validate_products(self, value):
+        product_ids = {product['product'] for product in value}
+        products = self.context.get('products')
+        if products is None:
+            products = Product.objects.in_bulk(product_ids)
+        unknown_ids = sorted(product_ids - products.keys())
+        if unknown_ids:
+            raise ValidationError({
+                'error': 'No products with ids {}'.format(
+                    ', '.join(map(str, unknown_ids))
+                )
+            })
+
         for product in value:
-            try:
-                product['obj'] = Product.objects.get(id=product.get('product'))
-            except ObjectDoesNotExist:
-                raise ValidationError({
-                    'error': f'No product with id {product.get("product")}'
-                })
+            product['obj'] = products[product['product']]
         return value
 
     def create(self, validated_data):
-        new_order = Order.objects.create(
-            firstname=validated_data['firstname'],
-            lastname=validated_data['lastname'],
-            phonenumber=validated_data['phonenumber'],
-            address=validated_data['address']
-        )
-        return new_order
+        return create_order(validated_data)
+
+
+class CanRegisterOrders(BasePermission):
+    message = 'Only partners may register orders in batches'
+
+    def has_permission(self, request, view):
+        return request.user.has_perm('foodcartapp.add_order')
+
+
+class PartnerRateThrottle(UserRateThrottle):
+    scope = 'partners'
+
+
+class MenuItemAvailabilitySerializer(Serializer):
+    product = IntegerField()
+    availability = BooleanField()
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return json_response(
+        request,
+        *get_banners_payload(),
+        cache_control='public, max-age={0}, s-maxage={0}'.format(
+            settings.BANNERS_CACHE_MAX_AGE
+        )
+    )
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
-
-
-@transaction.non_atomic_requests
+    return json_response(request, *get_products_payload())
+
+
+def restaurant_menu_api(request, restaurant_id):
+    payload = get_restaurant_menu_payload(restaurant_id)
+    if payload is None:
+        raise Http404('Ресторан не найден')
+    return json_response(request, *payload)
+
+
 @api_view(['POST'])
 def register_order(request):
-    order = request.data
-    serializer = OrderSerializer(data=order)
+    serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return Response(serializer.data)
 
-    serialized_order = serializer.save()
-    try:
-        order_lon, order_lat = fetch_coordinates(
-            settings.YA_API_KEY,
-            serialized_order.address
-        )
-        PlaceGeolocation.objects.get_or_create(
-            address=serialized_order.address,
-            lon=order_lon,
-            lat=order_lat
-        )
-    except TypeError:
-        logging.warning("Order location not found")
-    ordered_products = serializer.validated_data['products']
-
-    order_items = [
-        OrderItem(
-            order=serialized_order,
-            product=product['obj'],
-            quantity=product['quantity'],
-            price=product['obj'].price * int(product['quantity'])
-        )
-        for product in ordered_products
-    ]
 
-    OrderItem.objects.bulk_create(order_items)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication, SessionAuthentication])
+@permission_classes([CanRegisterOrders])
+@throttle_classes([PartnerRateThrottle])
+def register_orders_batch(request):
+    if not isinstance(request.data, list):
+        raise ValidationError({'error': 'Expected a list of orders'})
+    if len(request.data) > settings.ORDERS_BATCH_MAX_SIZE:
+        raise ValidationError({
+            'error': 'No more than {} orders per batch'.format(
+                settings.ORDERS_BATCH_MAX_SIZE
+            )
+        })
 
+    serializer = OrderSerializer(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
     return Response(serializer.data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def menu_availability_api(request, restaurant_id):
+    serializer = MenuItemAvailabilitySerializer(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    changes = {
+        item['product']: item['availability']
+        for item in serializer.validated_data
+    }
+    updated = set_restaurant_menu_availability(restaurant_id, changes)
+    return Response({'updated': updated})
@@ -1,3 +1,29 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GeocodingTask, PlaceGeolocation
+
+
+@admin.register(PlaceGeolocation)
+class PlaceGeolocationAdmin(admin.ModelAdmin):
+    search_fields = [
+        'address',
+    ]
+    list_display = [
+        'address',
+        'lon',
+        'lat',
+        'last_update',
+    ]
+
+
+@admin.register(GeocodingTask)
+class GeocodingTaskAdmin(admin.ModelAdmin):
+    search_fields = [
+        'address',
+    ]
+    list_display = [
+        'address',
+        'created_at',
+        'available_at',
+        'attempts',
+    ]
@@ -0,0 +1,102 @@
+import numpy as np
+from geopy import distance
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_radians(coordinates):
+    """Convert (lon, lat) pairs in degrees to an (n, 2) array of radians."""
+    return np.radians(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+
+
+def bounding_box(lon, lat, radius_km):
+    """Return (min_lon, min_lat, max_lon, max_lat) around a circle.
+
+    The box contains every point within radius_km of (lon, lat). Near
+    the poles it spans all longitudes; boxes crossing the antimeridian
+    are clipped to it.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_delta = float(np.degrees(angle))
+    min_lat = max(lat - lat_delta, -90.0)
+    max_lat = min(lat + lat_delta, 90.0)
+
+    cos_lat = np.cos(np.radians(lat))
+    if min_lat <= -90 or max_lat >= 90 or np.sin(angle) >= cos_lat:
+        return -180.0, min_lat, 180.0, max_lat
+    lon_delta = float(np.degrees(np.arcsin(np.sin(angle) / cos_lat)))
+    return (
+        max(lon - lon_delta, -180.0),
+        min_lat,
+        min(lon + lon_delta, 180.0),
+        max_lat,
+    )
+
+
+def cover_boxes(origins, radius_km, cells_per_box=4):
+    """Bounding boxes that cover radius_km around every origin.
+
+    Origins are grouped on a grid with cells cells_per_box radii wide
+    and each group gets the box around its own origins, so origins in
+    different cities do not pull in everything that lies between them.
+    """
+    cell_size = cells_per_box * float(np.degrees(radius_km / EARTH_RADIUS_KM))
+    boxes = {}
+    for lon, lat in origins:
+        box = bounding_box(lon, lat, radius_km)
+        cell = (int(lon // cell_size), int(lat // cell_size))
+        if cell in boxes:
+            min_lon, min_lat, max_lon, max_lat = boxes[cell]
+            box = (
+                min(min_lon, box[0]),
+                min(min_lat, box[1]),
+                max(max_lon, box[2]),
+                max(max_lat, box[3]),
+            )
+        boxes[cell] = box
+    return list(boxes.values())
+
+
+def haversine_matrix(origins, destinations):
+    """Great-circle distances in km between every origin and destination.
+
+    Both arguments are sequences of (lon, lat) pairs; the result has one
+    row per origin and one column per destination.
+    """
+    origins = to_radians(origins)
+    destinations = to_radians(destinations)
+    lon1 = origins[:, 0, np.newaxis]
+    lat1 = origins[:, 1, np.newaxis]
+    lon2 = destinations[np.newaxis, :, 0]
+    lat2 = destinations[np.newaxis, :, 1]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def refine_nearest(matrix, origins, destinations, top_k):
+    """Replace the top_k smallest finite distances of each row with geodesics.
+
+    Haversine is off by up to half a percent, which only matters when
+    ranking the closest candidates, so the slow ellipsoid solve is done
+    for those alone. The matrix is changed in place and returned.
+    """
+    if not top_k or not matrix.size:
+        return matrix
+
+    top_k = min(top_k, matrix.shape[1])
+    nearest = np.argpartition(matrix, top_k - 1, axis=1)[:, :top_k]
+    for row, columns in enumerate(nearest):
+        origin_lon, origin_lat = origins[row]
+        for column in columns:
+            if not np.isfinite(matrix[row, column]):
+                continue
+            destination_lon, destination_lat = destinations[column]
+            matrix[row, column] = distance.geodesic(
+                (origin_lat, origin_lon),
+                (destination_lat, destination_lon),
+            ).km
+    return matrix
@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from star_burger.metrics import observe_geocoder
+
+from .models import GeocodingTask, PlaceGeolocation
+from .signals import addresses_geocoded, places_updated
+from .views import fetch_coordinates
+
+
+logger = logging.getLogger(__name__)
+
+FAILED = object()
+
+_session = None
+_session_lock = threading.Lock()
+
+TASK_LEASE = timedelta(minutes=5)
+TASK_MAX_ATTEMPTS = 5
+
+_refresh_executor = ThreadPoolExecutor(max_workers=1)
+_refresh_lock = threading.Lock()
+_refreshing = set()
+
+
+def get_session():
+    """Return a process-wide session with a pool sized for the workers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.GEOCODER_WORKERS,
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def _fetch_one(address, session):
+    started_at = time.perf_counter()
+    try:
+        coordinates = fetch_coordinates(
+            settings.YA_API_KEY,
+            address,
+            session=session,
+        )
+    except (requests.RequestException, KeyError, ValueError):
+        observe_geocoder(time.perf_counter() - started_at, 'error')
+        logger.warning('Geocoder request failed for %r', address, exc_info=True)
+        return address, FAILED
+
+    observe_geocoder(
+        time.perf_counter() - started_at,
+        'found' if coordinates else 'not_found',
+    )
+    if not coordinates:
+        return address, None
+    lon, lat = coordinates
+    return address, (float(lon), float(lat))
+
+
+def fetch_many(addresses, session=None):
+    """Geocode addresses concurrently.
+
+    Returns (lon, lat) for found addresses and None for the ones the
+    geocoder does not know. Failed requests are left out, so they are
+    neither cached nor remembered as misses.
+    """
+    addresses = list(addresses)
+    if not addresses:
+        return {}
+
+    session = session or get_session()
+    workers = min(settings.GEOCODER_WORKERS, len(addresses))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda address: _fetch_one(address, session),
+            addresses,
+        )
+        return {
+            address: coordinates
+            for address, coordinates in results
+            if coordinates is not FAILED
+        }
+
+
+def save_places(results, known_ids=None):
+    """Store fetched results, remembering misses with empty coordinates."""
+    known_ids = known_ids or {}
+    now = timezone.now()
+    new_places = []
+    changed_places = []
+    for address, coordinates in results.items():
+        lon, lat = coordinates or (None, None)
+        place = PlaceGeolocation(
+            id=known_ids.get(address),
+            address=address,
+            lon=lon,
+            lat=lat,
+            last_update=now,
+        )
+        if place.id:
+            changed_places.append(place)
+        else:
+            new_places.append(place)
+
+    PlaceGeolocation.objects.bulk_create(new_places, ignore_conflicts=True)
+    PlaceGeolocation.objects.bulk_update(
+        changed_places,
+        ['lon', 'lat', 'last_update'],
+    )
+    if results:
+        places_updated.send(sender=PlaceGeolocation, addresses=list(results))
+
+
+def _refresh_places(addresses, known_ids):
+    try:
+        save_places(fetch_many(addresses), known_ids)
+    except Exception:
+        logger.exception('Background geocoder refresh failed')
+    finally:
+        with _refresh_lock:
+            _refreshing.difference_update(addresses)
+        connection.close()
+
+
+def refresh_in_background(addresses, known_ids):
+    """Schedule a refresh of stale places unless one is already running."""
+    with _refresh_lock:
+        addresses = set(addresses) - _refreshing
+        if not addresses:
+            return
+        _refreshing.update(addresses)
+    _refresh_executor.submit(_refresh_places, addresses, known_ids)
+
+
+def geocode_addresses(addresses, session=None):
+    """Resolve addresses to (lon, lat) pairs.
+
+    Known places are read from PlaceGeolocation in one query, the misses
+    are sent to the geocoder in parallel and stored with one bulk insert.
+    Addresses the geocoder could not find are remembered for
+    GEOCODER_MISS_TTL seconds and are absent from the result. Places
+    older than GEOCODER_HIT_TTL are returned as is and refreshed in the
+    background.
+    """
+    addresses = {address for address in addresses if address}
+    if not addresses:
+        return {}
+
+    now = timezone.now()
+    miss_expires_at = now - timedelta(seconds=settings.GEOCODER_MISS_TTL)
+    hit_expires_at = now - timedelta(seconds=settings.GEOCODER_HIT_TTL)
+
+    coordinates = {}
+    known_ids = {}
+    cached = set()
+    stale = set()
+    places = PlaceGeolocation.objects.filter(
+        address__in=addresses
+    ).values_list('id', 'address', 'lon', 'lat', 'last_update')
+    for place_id, address, lon, lat, last_update in places:
+        known_ids[address] = place_id
+        if lon is None or lat is None:
+            if last_update > miss_expires_at:
+                cached.add(address)
+            continue
+        coordinates[address] = (lon, lat)
+        cached.add(address)
+        if last_update < hit_expires_at:
+            stale.add(address)
+
+    found = fetch_many(addresses - cached, session=session)
+    save_places(found, known_ids)
+    coordinates.update(
+        (address, place)
+        for address, place in found.items()
+        if place
+    )
+
+    if stale:
+        refresh_in_background(stale, known_ids)
+
+    return coordinates
+
+
+def get_known_coordinates(addresses):
+    """Read (lon, lat) of already geocoded addresses without fetching."""
+    places = PlaceGeolocation.objects.filter(
+        address__in={address for address in addresses if address},
+        lon__isnull=False,
+        lat__isnull=False,
+    ).values_list('address', 'lon', 'lat')
+    return {address: (lon, lat) for address, lon, lat in places}
+
+
+def enqueue_addresses(addresses):
+    """Queue addresses for geocode_worker without calling the geocoder."""
+    GeocodingTask.objects.bulk_create(
+        [
+            GeocodingTask(address=address)
+            for address in set(addresses)
+            if address
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def claim_tasks(batch_size):
+    """Lease a batch of due tasks so that parallel workers skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            GeocodingTask.objects
+            .select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by('available_at')[:batch_size]
+        )
+        GeocodingTask.objects.filter(
+            id__in=[task.id for task in tasks]
+        ).update(available_at=now + TASK_LEASE)
+    return tasks
+
+
+def process_tasks(batch_size=100):
+    """Geocode one batch of queued addresses and return its size.
+
+    Tasks are done once their address is stored in PlaceGeolocation,
+    found or not. Failed requests are retried with exponential backoff
+    and dropped after TASK_MAX_ATTEMPTS.
+    """
+    tasks = claim_tasks(batch_size)
+    if not tasks:
+        return 0
+
+    geocode_addresses(task.address for task in tasks)
+    stored = set(
+        PlaceGeolocation.objects.filter(
+            address__in=[task.address for task in tasks]
+        ).values_list('address', flat=True)
+    )
+
+    done_ids = []
+    retried = []
+    now = timezone.now()
+    for task in tasks:
+        task.attempts += 1
+        if task.address in stored or task.attempts >= TASK_MAX_ATTEMPTS:
+            if task.address not in stored:
+                logger.warning('Giving up geocoding %r', task.address)
+            done_ids.append(task.id)
+            continue
+        task.available_at = now + timedelta(minutes=2 ** task.attempts)
+        retried.append(task)
+
+    GeocodingTask.objects.filter(id__in=done_ids).delete()
+    GeocodingTask.objects.bulk_update(retried, ['attempts', 'available_at'])
+    if stored:
+        addresses_geocoded.send(sender=GeocodingTask, addresses=list(stored))
+    return len(tasks)
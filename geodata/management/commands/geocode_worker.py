@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from geodata.geocoder import process_tasks
+
+
+class Command(BaseCommand):
+    help = 'Геокодирует адреса из очереди GeocodingTask'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='сколько адресов брать из очереди за раз',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2,
+            help='пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='обработать очередь один раз и выйти',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_tasks(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано адресов: {processed}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geodata', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='placegeolocation',
+            options={'verbose_name': 'место', 'verbose_name_plural': 'места'},
+        ),
+        migrations.AlterField(
+            model_name='placegeolocation',
+            name='lat',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=16, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='placegeolocation',
+            name='lon',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=16, null=True, verbose_name='Долгота'),
+        ),
+    ]
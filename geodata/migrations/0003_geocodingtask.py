@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geodata', '0002_place_not_found'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodingTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=200, unique=True, verbose_name='Адрес')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('available_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Доступна с')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+            ],
+            options={
+                'verbose_name': 'задача геокодирования',
+                'verbose_name_plural': 'задачи геокодирования',
+                'ordering': ['available_at'],
+            },
+        ),
+    ]
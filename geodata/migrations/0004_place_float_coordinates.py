@@ -0,0 +1,27 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geodata', '0003_geocodingtask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='placegeolocation',
+            name='lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='placegeolocation',
+            name='lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+        migrations.AddIndex(
+            model_name='placegeolocation',
+            index=models.Index(fields=['lat', 'lon'], name='place_lat_lon_idx'),
+        ),
+    ]
@@ -1,4 +1,26 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class PlaceQuerySet(models.QuerySet):
+    def in_box(self, min_lon, min_lat, max_lon, max_lat):
+        return self.in_boxes([(min_lon, min_lat, max_lon, max_lat)])
+
+    def in_boxes(self, boxes):
+        """Places inside any of the (min_lon, min_lat, max_lon, max_lat) boxes.
+
+        Each box is a range scan over the (lat, lon) index.
+        """
+        condition = Q()
+        for min_lon, min_lat, max_lon, max_lat in boxes:
+            condition |= Q(
+                lat__range=(min_lat, max_lat),
+                lon__range=(min_lon, max_lon),
+            )
+        if not condition:
+            return self.none()
+        return self.filter(condition)
 
 
 class PlaceGeolocation(models.Model):
@@ -7,17 +29,65 @@ class PlaceGeolocation(models.Model):
         max_length=200,
         unique=True
     )
-    lon = models.DecimalField(
-        max_digits=16,
-        decimal_places=14,
-        verbose_name='Долгота'
+    lon = models.FloatField(
+        verbose_name='Долгота',
+        null=True,
+        blank=True,
     )
-    lat = models.DecimalField(
-        max_digits=16,
-        decimal_places=14,
-        verbose_name='Широта'
+    lat = models.FloatField(
+        verbose_name='Широта',
+        null=True,
+        blank=True,
     )
     last_update = models.DateTimeField(
         auto_now=True,
         verbose_name='Последнее обновление'
     )
+
+    objects = PlaceQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'место'
+        verbose_name_plural = 'места'
+        indexes = [
+            models.Index(
+                fields=['lat', 'lon'],
+                name='place_lat_lon_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.address
+
+    @property
+    def is_found(self):
+        return self.lon is not None and self.lat is not None
+
+
+class GeocodingTask(models.Model):
+    address = models.CharField(
+        'Адрес',
+        max_length=200,
+        unique=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Доступна с'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+        ordering = ['available_at']
+
+    def __str__(self):
+        return self.address
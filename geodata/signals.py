@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent with addresses=[...] after geocoder results are stored in bulk,
+# which bypasses the model save signals.
+places_updated = Signal()
+
+# Sent with addresses=[...] by the geocode worker once queued addresses
+# are resolved, including the ones that were already known.
+addresses_geocoded = Signal()
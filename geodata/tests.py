@@ -1,3 +1,306 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from geopy import distance
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .distances import (
+    bounding_box,
+    cover_boxes,
+    haversine_matrix,
+    refine_nearest,
+)
+from .geocoder import (
+    TASK_MAX_ATTEMPTS,
+    enqueue_addresses,
+    fetch_many,
+    geocode_addresses,
+    process_tasks,
+)
+from .models import GeocodingTask, PlaceGeolocation
+
+
+class StubResponse:
+    def __init__(self, coordinates):
+        self.coordinates = coordinates
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        members = []
+        if self.coordinates:
+            members.append({
+                'GeoObject': {'Point': {'pos': '{} {}'.format(*self.coordinates)}}
+            })
+        return {'response': {'GeoObjectCollection': {'featureMember': members}}}
+
+
+class StubSession:
+    """Answers like the Yandex geocoder from a dict of known places.
+
+    Addresses missing from the dict are not found, and the ones listed
+    in failing raise a connection error.
+    """
+
+    def __init__(self, places=None, failing=()):
+        self.places = places or {}
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params, timeout):
+        address = params['geocode']
+        with self.lock:
+            self.calls.append(address)
+        if address in self.failing:
+            raise requests.ConnectionError(address)
+        return StubResponse(self.places.get(address))
+
+
+def count_queries(context, statement, table):
+    return sum(
+        1
+        for query in context.captured_queries
+        if query['sql'].startswith(statement) and table in query['sql']
+    )
+
+
+class FetchManyTest(TestCase):
+    def test_failed_requests_are_left_out(self):
+        session = StubSession(
+            {'Тверская, 1': (37.61, 55.76)},
+            failing=['Арбат, 1'],
+        )
+        with self.assertLogs('geodata.geocoder', 'WARNING'):
+            found = fetch_many(['Тверская, 1', 'Новая, 1', 'Арбат, 1'], session)
+        self.assertEqual(found, {'Тверская, 1': (37.61, 55.76), 'Новая, 1': None})
+
+
+class GeocodeAddressesTest(TestCase):
+    def test_known_places_are_read_with_one_query(self):
+        PlaceGeolocation.objects.bulk_create([
+            PlaceGeolocation(address='Тверская, 1', lon=37.61, lat=55.76),
+            PlaceGeolocation(address='Арбат, 1', lon=37.59, lat=55.75),
+        ])
+        session = StubSession()
+        with self.assertNumQueries(1):
+            coordinates = geocode_addresses(['Тверская, 1', 'Арбат, 1'], session)
+        self.assertEqual(coordinates, {
+            'Тверская, 1': (37.61, 55.76),
+            'Арбат, 1': (37.59, 55.75),
+        })
+        self.assertEqual(session.calls, [])
+
+    def test_new_places_are_stored_with_one_insert(self):
+        session = StubSession({
+            'Тверская, 1': (37.61, 55.76),
+            'Арбат, 1': (37.59, 55.75),
+        })
+        with CaptureQueriesContext(connection) as context:
+            coordinates = geocode_addresses(
+                ['Тверская, 1', 'Арбат, 1', 'Новая, 1'],
+                session,
+            )
+        self.assertEqual(set(coordinates), {'Тверская, 1', 'Арбат, 1'})
+        self.assertEqual(
+            count_queries(context, 'SELECT', 'geodata_placegeolocation'),
+            1,
+        )
+        self.assertEqual(
+            count_queries(context, 'INSERT', 'geodata_placegeolocation'),
+            1,
+        )
+        self.assertEqual(PlaceGeolocation.objects.count(), 3)
+
+    def test_misses_are_remembered_for_the_miss_ttl(self):
+        session = StubSession()
+        self.assertEqual(geocode_addresses(['Новая, 1'], session), {})
+        place = PlaceGeolocation.objects.get(address='Новая, 1')
+        self.assertFalse(place.is_found)
+
+        self.assertEqual(geocode_addresses(['Новая, 1'], session), {})
+        self.assertEqual(session.calls, ['Новая, 1'])
+
+        with override_settings(GEOCODER_MISS_TTL=0):
+            geocode_addresses(['Новая, 1'], session)
+        self.assertEqual(session.calls, ['Новая, 1', 'Новая, 1'])
+
+    def test_failed_requests_are_not_cached(self):
+        session = StubSession(failing=['Арбат, 1'])
+        with self.assertLogs('geodata.geocoder', 'WARNING'):
+            self.assertEqual(geocode_addresses(['Арбат, 1'], session), {})
+            self.assertFalse(PlaceGeolocation.objects.exists())
+            geocode_addresses(['Арбат, 1'], session)
+        self.assertEqual(session.calls, ['Арбат, 1', 'Арбат, 1'])
+
+
+class ProcessTasksTest(TestCase):
+    def process(self, session):
+        with mock.patch('geodata.geocoder.get_session', return_value=session):
+            return process_tasks()
+
+    def process_failing(self, session):
+        with self.assertLogs('geodata.geocoder', 'WARNING'):
+            return self.process(session)
+
+    def make_due(self):
+        GeocodingTask.objects.update(available_at=timezone.now())
+
+    def test_found_addresses_are_done(self):
+        enqueue_addresses(['Тверская, 1', 'Новая, 1'])
+        session = StubSession({'Тверская, 1': (37.61, 55.76)})
+        self.assertEqual(self.process(session), 2)
+        self.assertFalse(GeocodingTask.objects.exists())
+        self.assertEqual(PlaceGeolocation.objects.count(), 2)
+
+    def test_failed_addresses_are_retried_with_backoff(self):
+        enqueue_addresses(['Арбат, 1'])
+        session = StubSession(failing=['Арбат, 1'])
+        for attempt in range(1, TASK_MAX_ATTEMPTS):
+            started_at = timezone.now()
+            self.process_failing(session)
+            task = GeocodingTask.objects.get()
+            self.assertEqual(task.attempts, attempt)
+            self.assertGreaterEqual(
+                task.available_at,
+                started_at + timedelta(minutes=2 ** attempt),
+            )
+            self.assertEqual(self.process(session), 0)
+            self.make_due()
+
+        self.process_failing(session)
+        self.assertFalse(GeocodingTask.objects.exists())
+        self.assertFalse(PlaceGeolocation.objects.exists())
+
+
+MOSCOW = (37.6176, 55.7558)
+SAINT_PETERSBURG = (30.3141, 59.9386)
+KAZAN = (49.1221, 55.7887)
+
+
+class HaversineMatrixTest(SimpleTestCase):
+    def test_matches_geodesic_within_half_a_percent(self):
+        origins = [MOSCOW, KAZAN]
+        destinations = [SAINT_PETERSBURG, MOSCOW, KAZAN]
+        matrix = haversine_matrix(origins, destinations)
+        self.assertEqual(matrix.shape, (2, 3))
+        for row, (origin_lon, origin_lat) in enumerate(origins):
+            for column, (lon, lat) in enumerate(destinations):
+                expected = distance.geodesic(
+                    (origin_lat, origin_lon), (lat, lon)
+                ).km
+                self.assertAlmostEqual(
+                    matrix[row, column], expected, delta=expected * 0.005
+                )
+
+    def test_empty_destinations(self):
+        self.assertEqual(haversine_matrix([MOSCOW], []).shape, (1, 0))
+
+
+class RefineNearestTest(SimpleTestCase):
+    def test_only_the_nearest_become_geodesics(self):
+        destinations = [SAINT_PETERSBURG, KAZAN, MOSCOW]
+        matrix = haversine_matrix([MOSCOW], destinations)
+        matrix[0, 2] = np.inf
+        haversine = matrix.copy()
+
+        refine_nearest(matrix, [MOSCOW], destinations, top_k=1)
+
+        geodesic = distance.geodesic(MOSCOW[::-1], SAINT_PETERSBURG[::-1]).km
+        self.assertAlmostEqual(matrix[0, 0], geodesic, places=6)
+        self.assertEqual(matrix[0, 1], haversine[0, 1])
+        self.assertEqual(matrix[0, 2], np.inf)
+
+    def test_infinite_distances_are_kept(self):
+        matrix = np.full((1, 2), np.inf)
+        refine_nearest(matrix, [MOSCOW], [KAZAN, SAINT_PETERSBURG], top_k=2)
+        self.assertTrue(np.isinf(matrix).all())
+
+
+def in_box(point, box):
+    lon, lat = point
+    min_lon, min_lat, max_lon, max_lat = box
+    return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+
+
+class BoundingBoxTest(SimpleTestCase):
+    def test_contains_the_circle(self):
+        box = bounding_box(*MOSCOW, 10)
+        for bearing in np.linspace(0, 360, 72, endpoint=False):
+            lat, lon, _ = distance.distance(kilometers=9.9).destination(
+                MOSCOW[::-1], bearing
+            )
+            self.assertTrue(in_box((lon, lat), box), bearing)
+
+    def test_is_tight(self):
+        min_lon, min_lat, max_lon, max_lat = bounding_box(*MOSCOW, 10)
+        corners = [(min_lon, MOSCOW[1]), (MOSCOW[0], max_lat)]
+        for km in haversine_matrix([MOSCOW], corners)[0]:
+            self.assertAlmostEqual(km, 10, delta=0.01)
+
+    def test_near_the_pole_spans_all_longitudes(self):
+        min_lon, _, max_lon, max_lat = bounding_box(0, 89.99, 10)
+        self.assertEqual((min_lon, max_lon, max_lat), (-180, 180, 90))
+
+
+class CoverBoxesTest(SimpleTestCase):
+    def test_close_origins_share_boxes(self):
+        rng = np.random.default_rng(0)
+        origins = np.column_stack([
+            rng.uniform(37.60, 37.64, 100),
+            rng.uniform(55.74, 55.77, 100),
+        ])
+        # At most the four grid cells meeting at one corner.
+        self.assertLessEqual(len(cover_boxes(origins, 10)), 4)
+
+    def test_far_origins_get_their_own_boxes(self):
+        boxes = cover_boxes([MOSCOW, KAZAN], 10)
+        self.assertEqual(len(boxes), 2)
+        between = ((MOSCOW[0] + KAZAN[0]) / 2, (MOSCOW[1] + KAZAN[1]) / 2)
+        self.assertFalse(any(in_box(between, box) for box in boxes))
+        for origin in [MOSCOW, KAZAN]:
+            self.assertTrue(any(
+                in_box(origin, box) for box in boxes
+            ))
+
+
+class PlaceQuerySetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PlaceGeolocation.objects.bulk_create([
+            PlaceGeolocation(address='Москва', lon=MOSCOW[0], lat=MOSCOW[1]),
+            PlaceGeolocation(address='Казань', lon=KAZAN[0], lat=KAZAN[1]),
+            PlaceGeolocation(
+                address='Петербург',
+                lon=SAINT_PETERSBURG[0],
+                lat=SAINT_PETERSBURG[1],
+            ),
+            PlaceGeolocation(address='Не найдено'),
+        ])
+
+    def addresses(self, places):
+        return set(places.values_list('address', flat=True))
+
+    def test_in_box(self):
+        self.assertEqual(
+            self.addresses(PlaceGeolocation.objects.in_box(37, 55, 50, 56)),
+            {'Москва', 'Казань'},
+        )
+
+    def test_in_boxes(self):
+        places = PlaceGeolocation.objects.in_boxes([
+            bounding_box(*MOSCOW, 10),
+            bounding_box(*SAINT_PETERSBURG, 10),
+        ])
+        self.assertEqual(self.addresses(places), {'Москва', 'Петербург'})
+
+    def test_no_boxes(self):
+        self.assertFalse(PlaceGeolocation.objects.in_boxes([]).exists())
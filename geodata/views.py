@@ -1,13 +1,15 @@
 import requests
 
+from django.conf import settings
 
-def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
+
+def fetch_coordinates(apikey, address, session=None):
+    http = session or requests
+    response = http.get(settings.YA_GEOCODER_URL, params={
         "geocode": address,
         "apikey": apikey,
         "format": "json",
-    })
+    }, timeout=settings.GEOCODER_TIMEOUT)
     response.raise_for_status()
     found_places = response.json()[
         'response'
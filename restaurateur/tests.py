@@ -1,3 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-# Create your tests here.
+from foodcartapp.models import Order, OrderItem, Product
+
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class OrdersDashboardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(
+            name='Бургер', price=100, image='burger.png'
+        )
+        for address in ['Арбат, 1', 'Несуществующая, 1']:
+            order = Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79291000000',
+                address=address,
+            )
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price=100
+            )
+        cls.manager = get_user_model().objects.create_user(
+            'manager', is_staff=True
+        )
+
+    def test_dashboard_only_reads(self):
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/manager/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Расстояния ещё не посчитаны', count=2)
+        writes = [
+            query['sql']
+            for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS)
+        ]
+        self.assertEqual(writes, [])
+
+
+class OrdersChangesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user(
+            'manager', is_staff=True
+        )
+
+    def create_order(self, status):
+        return Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79291000000',
+            address='Арбат, 1',
+            status=status,
+        )
+
+    def get_changes(self, since):
+        self.client.force_login(self.manager)
+        response = self.client.get(
+            '/manager/orders/changes/', {'since': since.isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_old_finished_orders_are_not_reported(self):
+        finished = self.create_order(Order.FINISHED)
+        since = timezone.now()
+        Order.objects.filter(pk=finished.pk).update_total_prices()
+
+        changes = self.get_changes(since)
+
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['removed'], [])
+
+    def test_orders_finished_since_are_removed(self):
+        order = self.create_order(Order.PROCESSED)
+        since = timezone.now()
+        order.status = Order.FINISHED
+        order.save()
+
+        self.assertEqual(self.get_changes(since)['removed'], [order.id])
+        self.assertEqual(self.get_changes(timezone.now())['removed'], [])
@@ -14,6 +14,11 @@ urlpatterns = [
 
     # TODO заглушка для нереализованного функционала
     path('orders/', views.view_orders, name="view_orders"),
+    path(
+        'orders/changes/',
+        views.view_orders_changes,
+        name="view_orders_changes"
+    ),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
@@ -1,14 +1,18 @@
-import logging
+import json
 
-from geopy import distance
+import numpy as np
 
 from django import forms
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.views import View
-from django.urls import reverse_lazy, reverse
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import Prefetch
-from django.conf import settings
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
@@ -17,11 +21,9 @@ from foodcartapp.models import (
     Product,
     Restaurant,
     Order,
-    OrderItem,
-    RestaurantMenuItem
 )
-from geodata.models import PlaceGeolocation
-from geodata.views import fetch_coordinates
+from foodcartapp.catalogue import get_menu_matrix
+from foodcartapp.order_distances import get_order_distances
 
 
 class Login(forms.Form):
@@ -72,6 +74,10 @@ class LogoutView(auth_views.LogoutView):
     next_page = reverse_lazy('restaurateur:login')
 
 
+AVAILABLE_CELL = '<td class="menu-available"></td>'
+UNAVAILABLE_CELL = '<td class="menu-unavailable"></td>'
+
+
 def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
@@ -79,22 +85,17 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    products_with_availability = []
-    for product in products:
-        availability = {
-            item.restaurant_id: item.availability
-            for item in product.menu_items.all()
-        }
-        ordered_availability = [
-            availability.get(restaurant.id, False)
-            for restaurant in restaurants
-        ]
+    products = list(Product.objects.select_related('category'))
 
-        products_with_availability.append(
-            (product, ordered_availability)
-        )
+    availability = get_menu_matrix().get_grid(
+        [product.id for product in products],
+        [restaurant.id for restaurant in restaurants],
+    )
+    cells = np.where(availability, AVAILABLE_CELL, UNAVAILABLE_CELL)
+    products_with_availability = [
+        (product, mark_safe(''.join(row)))
+        for product, row in zip(products, cells.tolist())
+    ]
 
     return render(
         request,
@@ -113,121 +114,196 @@ def view_restaurants(request):
     })
 
 
+ORDERS_PAGE_SIZE = 50
+
+
+class OrdersFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус',
+        required=False,
+        choices=[('', 'Все')] + [
+            (status, name)
+            for status, name in Order.ORDER_STATUSES
+            if status != Order.FINISHED
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан',
+        required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def filter(self, orders):
+        if not self.is_valid():
+            return orders
+        if self.cleaned_data['status']:
+            orders = orders.filter(status=self.cleaned_data['status'])
+        if self.cleaned_data['restaurant']:
+            orders = orders.filter(
+                chosen_restaurant=self.cleaned_data['restaurant']
+            )
+        return orders
+
+
+def encode_cursor(order):
+    return urlsafe_base64_encode(json.dumps([
+        order.status,
+        order.registered_at.isoformat(),
+        order.id,
+    ]).encode())
+
+
+def decode_cursor(cursor):
+    """Return (status, registered_at, id) or None for an empty cursor.
+
+    Raises ValueError when the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        status, registered_at, order_id = json.loads(
+            urlsafe_base64_decode(cursor)
+        )
+        registered_at = parse_datetime(registered_at)
+        order_id = int(order_id)
+    except (TypeError, ValueError) as error:
+        raise ValueError('Malformed cursor') from error
+    if not registered_at or not isinstance(status, str):
+        raise ValueError('Malformed cursor')
+    return status, registered_at, order_id
+
+
+def get_sort_key(order):
+    return '{}|{}|{:010d}'.format(
+        order.status,
+        order.registered_at.astimezone(timezone.utc).isoformat(),
+        order.id,
+    )
+
+
+def attach_restaurants_distances(orders):
+    """Rank the restaurants able to cook each pending order by distance.
+
+    Distances are only read from OrderRestaurantDistance: they are
+    stored by geocode_worker and by the signals that follow menus and
+    restaurants, never while the page is rendered. Orders without rows
+    show their distances_status instead.
+    """
+    for order in orders:
+        order.sort_key = get_sort_key(order)
+
+    pending_orders = {
+        order.id: order
+        for order in orders
+        if not order.chosen_restaurant_id
+    }
+    if not pending_orders:
+        return
+
+    distances = get_order_distances(pending_orders.keys())
+    for order_id, order in pending_orders.items():
+        order.restaurants_distances = [
+            (name, distance_km)
+            for _, name, distance_km in distances.get(order_id, [])
+        ]
+
+
+def get_active_orders():
+    return Order.objects.select_related(
+        'chosen_restaurant'
+    ).active()
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    order_details = Order.objects.prefetch_related(
-            'items'
-    ).prefetch_related(
-        'chosen_restaurant'
-    ).prefetch_related(
-        'items__product'
-    ).prefetch_related(
-        Prefetch(
-            'items__product__menu_items',
-            queryset=RestaurantMenuItem.objects.filter(availability=True)
-        )
-    ).prefetch_related(
-        'items__product__menu_items__restaurant'
-    ).exclude(status='FINISHED').get_order_price()
+    orders_filter = OrdersFilter(request.GET)
+    order_details = orders_filter.filter(get_active_orders())
+
+    try:
+        cursor = decode_cursor(request.GET.get('after', ''))
+    except ValueError:
+        return HttpResponseBadRequest('Malformed cursor')
+    if cursor:
+        order_details = order_details.after(*cursor)
+    else:
+        order_details = order_details.order_by('status', 'registered_at', 'id')
+
+    changes_since = timezone.now()
+    order_details = order_details[:ORDERS_PAGE_SIZE + 1]
+    attach_restaurants_distances(order_details)
+    orders = list(order_details)
+
+    next_page_url = None
+    if len(orders) > ORDERS_PAGE_SIZE:
+        orders = orders[:ORDERS_PAGE_SIZE]
+        next_query = request.GET.copy()
+        next_query['after'] = encode_cursor(orders[-1])
+        next_page_url = f'?{next_query.urlencode()}'
 
-    order_details.get_available_restaurants()
+    return render(request, template_name='order_items.html', context={
+        'order_items': orders,
+        'orders_filter': orders_filter,
+        'next_page_url': next_page_url,
+        'changes_since': changes_since.isoformat(),
+    })
 
-    order_addresses = [
-        order.address
-        for order in order_details
-    ]
 
-    restaurants = Restaurant.objects.prefetch_related(
-        Prefetch(
-            'menu_items',
-            queryset=RestaurantMenuItem.objects.prefetch_related(
-                'product'
-            ).filter(availability=True)
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_changes(request):
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+    except (TypeError, ValueError):
+        since = None
+    if not since:
+        return JsonResponse(
+            {'error': 'since must be an ISO 8601 datetime'},
+            status=400,
         )
-    ).all()
-
-    restaurants_addresses = [
-        restaurant.address
-        for restaurant in restaurants
-    ]
 
-    order_places = PlaceGeolocation.objects.filter(address__in=order_addresses)
-    restaurant_places = PlaceGeolocation.objects.filter(address__in=restaurants_addresses)
-    order_places_full = [place for place in order_places]
-    order_places_addresses = order_places.values_list('address', flat=True)
-    restaurant_places_addresses = restaurant_places.values_list('address', flat=True)
-
-    for restaurant in restaurants:
-        if restaurant.address not in restaurant_places_addresses:
-            try:
-                restaurant_lon, restaurant_lat = fetch_coordinates(
-                    settings.YA_API_KEY,
-                    restaurant.address
-                )
-                PlaceGeolocation.objects.create(
-                    address=restaurant.address,
-                    lon=restaurant_lon,
-                    lat=restaurant_lat
-                )
-                restaurant.geo_pos = (restaurant_lon, restaurant_lat)
-            except TypeError:
-                logging.warning("Restaurant location not found")
-        else:
-            restaurant_place_geo = ''
-            for place in restaurant_places:
-                if place.address == restaurant.address:
-                    restaurant_place_geo = (place.lon, place.lat)
-            restaurant.geo_pos = restaurant_place_geo
-
-    for order in order_details:
-        if order.address not in order_places_addresses:
-            try:
-                order_lon, order_lat = fetch_coordinates(
-                    settings.YA_API_KEY,
-                    order.address
-                )
-                PlaceGeolocation.objects.update_or_create(
-                    address=order.address,
-                    lon=order_lon,
-                    lat=order_lat
-                )
-                order_geo_pos = (order_lon, order_lat)
-            except TypeError:
-                logging.warning("Order location not found")
-        else:
-            order_geo_pos = ''
-            for place in order_places_full:
-                if place.address == order.address:
-                    order_geo_pos = (place.lon, place.lat)
-
-        if not order.chosen_restaurant:
-            restaurants_distances = {}
-            for restaurant in restaurants:
-                if restaurant.geo_pos:
-                    dist_to_restaurant = distance.distance(
-                        restaurant.geo_pos,
-                        order_geo_pos
-                    )
-
-                if restaurant in order.available_restaurants:
-                    restaurants_distances[
-                                     restaurant.name
-                                 ] = dist_to_restaurant
-
-                if not restaurants_distances:
-                    order.restaurants_distances = 'Ошибка определения координат'
-
-                else:
-                    order.restaurants_distances = dict(
-                        sorted(
-                            restaurants_distances.items(), key=lambda x: x[1]
-                        )
-                    )
-        order.order_url = reverse(
-            'admin:foodcartapp_order_change',
-            args=(order.id,)
+    changes_since = timezone.now()
+    # Only orders the dashboard may be showing: finished ones are
+    # reported once, when they leave it, not on every later update.
+    changed_ids = list(
+        Order.objects.active()
+        .filter(updated_at__gte=since)
+        .order_by()
+        .values_list('id', flat=True)
+        .union(
+            Order.objects
+            .filter(finished_at__gte=since)
+            .order_by()
+            .values_list('id', flat=True)
         )
+    )
+    orders_filter = OrdersFilter(request.GET)
+    changed_orders = orders_filter.filter(
+        get_active_orders()
+    ).filter(id__in=changed_ids)
+    attach_restaurants_distances(changed_orders)
+
+    shown_ids = set()
+    changes = []
+    for order in changed_orders:
+        shown_ids.add(order.id)
+        changes.append({
+            'id': order.id,
+            'sort_key': order.sort_key,
+            'html': render_to_string(
+                'order_item_row.html',
+                {'item': order},
+                request=request,
+            ),
+        })
 
-    return render(request, template_name='order_items.html', context={
-        'order_items': order_details
+    return JsonResponse({
+        'since': changes_since.isoformat(),
+        'changed': changes,
+        'removed': [
+            order_id
+            for order_id in changed_ids
+            if order_id not in shown_ids
+        ],
     })
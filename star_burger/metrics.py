@@ -0,0 +1,178 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import HttpResponse
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Cumulative histogram kept in the memory of one process.
+
+    Every worker process has its own numbers; Prometheus sums them up
+    when each worker is scraped as a separate target.
+    """
+
+    def __init__(self, name, documentation, buckets, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                }
+            series['counts'][bucket] += 1
+            series['sum'] += value
+
+    def _labels(self, label_values, **extra):
+        labels = list(zip(self.label_names, label_values)) + list(extra.items())
+        if not labels:
+            return ''
+        return '{%s}' % ','.join(
+            '{}="{}"'.format(name, escape_label_value(value))
+            for name, value in labels
+        )
+
+    def expose(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self._lock:
+            series = {
+                label_values: (list(values['counts']), values['sum'])
+                for label_values, values in self._series.items()
+            }
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self._labels(label_values, le=format_value(upper_bound))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            cumulative += counts[-1]
+            labels = self._labels(label_values, le='+Inf')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = self._labels(label_values)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def escape_label_value(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def format_value(value):
+    return repr(float(value))
+
+
+REQUEST_DURATION = Histogram(
+    'starburger_request_duration_seconds',
+    'Time spent processing a request.',
+    LATENCY_BUCKETS,
+    ['view'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'starburger_request_db_queries',
+    'SQL queries executed while processing a request.',
+    QUERY_COUNT_BUCKETS,
+    ['view'],
+)
+REQUEST_DB_DURATION = Histogram(
+    'starburger_request_db_duration_seconds',
+    'Time spent in SQL queries while processing a request.',
+    LATENCY_BUCKETS,
+    ['view'],
+)
+GEOCODER_DURATION = Histogram(
+    'starburger_geocoder_request_duration_seconds',
+    'Time spent in outbound geocoder requests.',
+    LATENCY_BUCKETS,
+    ['outcome'],
+)
+HISTOGRAMS = [
+    REQUEST_DURATION,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_DURATION,
+    GEOCODER_DURATION,
+]
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started_at
+
+
+class MetricsMiddleware:
+    """Record latency, query count and query time of every request.
+
+    Queries are counted with an execute wrapper rather than
+    connection.queries, so it works with DEBUG turned off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_timer = QueryTimer()
+        started_at = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started_at
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        REQUEST_DURATION.observe(duration, view)
+        REQUEST_DB_QUERIES.observe(query_timer.count, view)
+        REQUEST_DB_DURATION.observe(query_timer.duration, view)
+        return response
+
+
+def observe_geocoder(duration, outcome):
+    GEOCODER_DURATION.observe(duration, outcome)
+
+
+@staff_member_required
+def metrics_view(request):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
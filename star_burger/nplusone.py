@@ -0,0 +1,147 @@
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+CALL_SITE_DEPTH = 3
+# Middleware frames sit on every stack and never point at the culprit.
+IGNORED_FILES = {__file__, metrics.__file__}
+
+
+def fingerprint(sql):
+    """Normalize SQL so that queries differing only in values match.
+
+    Literals become ?, IN lists of any length collapse to (...), and
+    whitespace is squeezed.
+    """
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def get_call_site():
+    """Innermost frames of project code, skipping libraries and middleware."""
+    project_frames = [
+        frame
+        for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in IGNORED_FILES
+    ]
+    return [
+        '{}:{} in {}'.format(
+            os.path.relpath(frame.filename, settings.BASE_DIR),
+            frame.lineno,
+            frame.name,
+        )
+        for frame in project_frames[-CALL_SITE_DEPTH:]
+    ]
+
+
+class QueryFingerprinter:
+    """Execute wrapper counting queries by fingerprint.
+
+    The call site is captured only when a fingerprint first goes over
+    the threshold, so ordinary queries cost one regex pass each.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.call_sites = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == self.threshold + 1:
+            self.call_sites[key] = get_call_site()
+        return execute(sql, params, many, context)
+
+    def get_repeats(self):
+        """Return [(fingerprint, count, call_site)] over the threshold."""
+        return [
+            (key, count, self.call_sites.get(key, []))
+            for key, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+
+@contextmanager
+def fingerprint_queries(threshold):
+    fingerprinter = QueryFingerprinter(threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(fingerprinter))
+        yield fingerprinter
+
+
+def format_repeats(repeats):
+    return '\n'.join(
+        '{} x {}\n    at {}'.format(
+            count,
+            key,
+            ' <- '.join(reversed(call_site)) or 'unknown',
+        )
+        for key, count, call_site in repeats
+    )
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold=None):
+    """Fail if any query fingerprint repeats more than threshold times.
+
+    Wrap a test client request to guard a view:
+
+        with assert_no_n_plus_one():
+            client.get('/manager/orders/')
+    """
+    if threshold is None:
+        threshold = settings.NPLUSONE_THRESHOLD or 5
+    with fingerprint_queries(threshold) as fingerprinter:
+        yield fingerprinter
+    repeats = fingerprinter.get_repeats()
+    if repeats:
+        raise AssertionError(
+            'Repeated queries look like N+1:\n' + format_repeats(repeats)
+        )
+
+
+class NPlusOneMiddleware:
+    """Log requests in which one query fingerprint repeats too often.
+
+    Enabled by setting NPLUSONE_THRESHOLD above zero.
+    """
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_THRESHOLD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with fingerprint_queries(settings.NPLUSONE_THRESHOLD) as fingerprinter:
+            response = self.get_response(request)
+        repeats = fingerprinter.get_repeats()
+        if repeats:
+            logger.warning(
+                'Possible N+1 queries in %s %s:\n%s',
+                request.method,
+                request.path,
+                format_repeats(repeats),
+            )
+        return response
@@ -11,10 +11,30 @@ env.read_env()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 YA_API_KEY = env('YANDEX_API_KEY')
+YA_GEOCODER_URL = env('YA_GEOCODER_URL', 'https://geocode-maps.yandex.ru/1.x')
+GEOCODER_WORKERS = env.int('GEOCODER_WORKERS', 8)
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_MISS_TTL = env.int('GEOCODER_MISS_TTL', 60 * 60 * 24)
+GEOCODER_HIT_TTL = env.int('GEOCODER_HIT_TTL', 60 * 60 * 24 * 30)
+DISTANCE_GEODESIC_TOP_K = env.int('DISTANCE_GEODESIC_TOP_K', 0)
+DELIVERY_RADIUS_KM = env.float('DELIVERY_RADIUS_KM', 0)
+ORDERS_BATCH_MAX_SIZE = env.int('ORDERS_BATCH_MAX_SIZE', 1000)
+ORDERS_BATCH_RATE = env('ORDERS_BATCH_RATE', '60/min')
+RESTAURANT_LOAD_CAP = env.int('RESTAURANT_LOAD_CAP', 10)
+BANNERS_CACHE_MAX_AGE = env.int('BANNERS_CACHE_MAX_AGE', 60 * 5)
+CATALOGUE_CACHE_TIMEOUT = env.int('CATALOGUE_CACHE_TIMEOUT', 60 * 10)
+NPLUSONE_THRESHOLD = env.int('NPLUSONE_THRESHOLD', 0)
 
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', True)
 
+API_JSON_ENCODER = env(
+    'API_JSON_ENCODER',
+    'foodcartapp.renderers.dumps_stdlib'
+)
+API_JSON_INDENT = env.int('API_JSON_INDENT', 4 if DEBUG else 0)
+API_RESPONSE_COMPRESSION = env.bool('API_RESPONSE_COMPRESSION', True)
+
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 
 INSTALLED_APPS = [
@@ -27,12 +47,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'phonenumber_field',
     'rest_framework'
 ]
 
 MIDDLEWARE = [
+    'star_burger.metrics.MetricsMiddleware',
+    'star_burger.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,12 +61,21 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareExcluding404'
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(-1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'star_burger.urls'
 
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_RATES': {
+        'partners': ORDERS_BATCH_RATE,
+    },
+}
+
 DEBUG_TOOLBAR_PANELS = [
     'debug_toolbar.panels.versions.VersionsPanel',
     'debug_toolbar.panels.timer.TimerPanel',
@@ -88,6 +118,10 @@ DATABASES = {
     'default': dj_database_url.parse(env('DB_URL'))
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://')
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
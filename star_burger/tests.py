@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .metrics import Histogram
+
+
+class HistogramTest(SimpleTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency.', [1, 0.1])
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.expose(), [
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 3.65',
+            'latency_seconds_count 4',
+        ])
+
+    def test_series_are_labelled_and_sorted(self):
+        histogram = Histogram('queries', 'Queries.', [5], ['view'])
+        histogram.observe(7, 'orders')
+        histogram.observe(1, 'menu')
+
+        self.assertEqual(histogram.expose()[2:], [
+            'queries_bucket{view="menu",le="5.0"} 1',
+            'queries_bucket{view="menu",le="+Inf"} 1',
+            'queries_sum{view="menu"} 1.0',
+            'queries_count{view="menu"} 1',
+            'queries_bucket{view="orders",le="5.0"} 0',
+            'queries_bucket{view="orders",le="+Inf"} 1',
+            'queries_sum{view="orders"} 7.0',
+            'queries_count{view="orders"} 1',
+        ])
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram('queries', 'Queries.', [], ['view'])
+        histogram.observe(1, 'a"b\\c\nd')
+
+        self.assertEqual(
+            histogram.expose()[2],
+            'queries_bucket{view="a\\"b\\\\c\\nd",le="+Inf"} 1',
+        )
+
+    def test_no_series_before_observations(self):
+        histogram = Histogram('queries', 'Queries.', [1], ['view'])
+        self.assertEqual(histogram.expose(), [
+            '# HELP queries Queries.',
+            '# TYPE queries histogram',
+        ])
+
+
+class MetricsViewTest(TestCase):
+    def test_staff_only(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_exposition_format(self):
+        self.client.force_login(
+            get_user_model().objects.create_user('manager', is_staff=True)
+        )
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            b'# TYPE starburger_request_duration_seconds histogram',
+            response.content,
+        )
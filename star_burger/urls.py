@@ -20,6 +20,7 @@ from django.urls import path, include
 from django.shortcuts import render
 
 from . import settings
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +28,7 @@ urlpatterns = [
     path('api/', include('rest_framework.urls', namespace='rest_framework')),
     path('api/', include('foodcartapp.urls')),
     path('manager/', include('restaurateur.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG: